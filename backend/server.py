@@ -1,12 +1,24 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Request, Query
 from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReplaceOne, ReturnDocument, ASCENDING, TEXT, monitoring
+from pymongo.errors import BulkWriteError
+from contextlib import asynccontextmanager
 import os
+import json
+import time
+import zlib
+import asyncio
 import logging
+import threading
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple, Annotated
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
 import uuid
 from datetime import datetime, timezone
 
@@ -15,21 +27,158 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', '10')),
+    "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000')),
+    "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+    "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000')),
+}
+READINESS_PING_TIMEOUT = float(os.environ.get('READINESS_PING_TIMEOUT', '2'))
+
+# Criados no lifespan da aplicação
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Contadores do pool de conexões do Mongo, expostos em /api/ready"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"open": 0, "checked_out": 0, "created": 0, "closed": 0, "checkout_failed": 0, "cleared": 0}
+    
+    def _add(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.counts[key] += delta
+    
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        self._add(cleared=1)
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        self._add(open=1, created=1)
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        self._add(open=-1, closed=1)
+    
+    def connection_check_out_started(self, event):
+        pass
+    
+    def connection_check_out_failed(self, event):
+        self._add(checkout_failed=1)
+    
+    def connection_checked_out(self, event):
+        self._add(checked_out=1)
+    
+    def connection_checked_in(self, event):
+        self._add(checked_out=-1)
+
+
+pool_stats = PoolStats()
+service_state = {"ready": False, "started_at": None, "startup_duration_ms": None}
+
 
-app = FastAPI()
+async def warm_pool():
+    """Abre minPoolSize conexões antes de aceitar tráfego"""
+    await asyncio.gather(*(
+        client.admin.command("ping") for _ in range(max(1, MONGO_CLIENT_OPTIONS["minPoolSize"]))
+    ))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db
+    started = time.perf_counter()
+    client = AsyncIOMotorClient(mongo_url, event_listeners=[pool_stats], **MONGO_CLIENT_OPTIONS)
+    db = client[os.environ['DB_NAME']]
+    
+    try:
+        await warm_pool()
+        await startup_db()
+        service_state["started_at"] = datetime.now(timezone.utc).isoformat()
+        service_state["startup_duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        service_state["ready"] = True
+        logger.info(f"Startup completed in {service_state['startup_duration_ms']} ms")
+        yield
+    finally:
+        service_state["ready"] = False
+        await shutdown_db_client()
+
+
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
+# Limite de meses processados por uma única chamada ao gerador de recorrências
+MAX_RECURRENCE_MONTHS = 120
+# Anos cobertos por uma única consulta de tendências (uma linha por mês na resposta)
+MAX_TREND_YEARS = 50
+RECURRING_NOTES = "Gerado automaticamente (recorrência)"
+MIGRATION_BATCH_SIZE = 500
+# Ambos precisam ser >= 1: com 0 snapshots mantidos a poda usaria snapshots[-1] como base
+JOURNAL_SNAPSHOT_EVERY = max(1, int(os.environ.get('JOURNAL_SNAPSHOT_EVERY', '500')))
+JOURNAL_KEEP_SNAPSHOTS = max(1, int(os.environ.get('JOURNAL_KEEP_SNAPSHOTS', '3')))
+DEFAULT_HOUSEHOLD_ID = os.environ.get('DEFAULT_HOUSEHOLD_ID', 'default')
+BACKUP_COLLECTIONS = ("categories", "transactions", "incomes", "budgets")
+BACKUP_FLUSH_BYTES = 64 * 1024
+RESTORE_CHUNK_SIZE = 1000
+SEARCH_MAX_PAGE_SIZE = 200
+YEAR_MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+# Máximo de computações simultâneas (parâmetros distintos) por endpoint coalescido
+COALESCE_MAX_CONCURRENCY = int(os.environ.get('COALESCE_MAX_CONCURRENCY', '4'))
+# Divergências listadas no relatório de verificação da cópia analítica
+VERIFY_MAX_DIFFERENCES = 20
+# Quantidade de domicílios com cópia analítica residente em memória (LRU)
+ANALYTICS_MAX_HOUSEHOLDS = int(os.environ.get('ANALYTICS_MAX_HOUSEHOLDS', '64'))
+
+# Valores monetários são armazenados como centavos inteiros (int64); a API continua em reais
+TRANSACTION_AMOUNTS = {"planned_value": "planned_cents", "actual_value": "actual_cents"}
+INCOME_AMOUNTS = {
+    "aposentadoria": "aposentadoria_cents",
+    "salario": "salario_cents",
+    "recursos_externos": "recursos_externos_cents",
+}
+# Teto absoluto (em reais) aceito pela API: mantém centavos e somas anuais dentro do int64
+MAX_AMOUNT = 10 ** 12
+Amount = Annotated[float, Field(allow_inf_nan=False, ge=-MAX_AMOUNT, le=MAX_AMOUNT)]
+
+
+class RecurrenceRule(BaseModel):
+    amount: Amount
+    start_year: int
+    start_month: int = Field(ge=1, le=12)
+    end_year: Optional[int] = None
+    end_month: Optional[int] = Field(default=None, ge=1, le=12)
+    annual_adjustment: Optional[float] = Field(default=None, allow_inf_nan=False, ge=-100, le=1000)  # percentual aplicado a cada 12 meses
+
 
 class Category(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    household_id: str = DEFAULT_HOUSEHOLD_ID
     name: str
     due_day: Optional[int] = None
     color: str
     order: int
+    recurrence: Optional[RecurrenceRule] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
@@ -38,17 +187,26 @@ class CategoryCreate(BaseModel):
     due_day: Optional[int] = None
     color: str
     order: int
+    recurrence: Optional[RecurrenceRule] = None
+
+
+class RecurrenceGenerate(BaseModel):
+    start_year: int
+    start_month: int = Field(ge=1, le=12)
+    end_year: int
+    end_month: int = Field(ge=1, le=12)
 
 
 class Transaction(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    household_id: str = DEFAULT_HOUSEHOLD_ID
     category_id: str
-    month: int
+    month: int = Field(ge=1, le=12)
     year: int
-    planned_value: float
-    actual_value: float
+    planned_value: Amount
+    actual_value: Amount
     notes: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -56,104 +214,1317 @@ class Transaction(BaseModel):
 
 class TransactionCreate(BaseModel):
     category_id: str
-    month: int
+    month: int = Field(ge=1, le=12)
     year: int
-    planned_value: float
-    actual_value: float
+    planned_value: Amount
+    actual_value: Amount
     notes: Optional[str] = None
 
 
 class TransactionUpdate(BaseModel):
-    planned_value: Optional[float] = None
-    actual_value: Optional[float] = None
+    planned_value: Optional[Amount] = None
+    actual_value: Optional[Amount] = None
     notes: Optional[str] = None
 
 
+class TransactionSearchResult(BaseModel):
+    total: int
+    page: int
+    page_size: int
+    pages: int
+    items: List[Transaction]
+
+
 class Budget(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    household_id: str = DEFAULT_HOUSEHOLD_ID
     year: int
     category_id: str
-    monthly_target: float
+    monthly_target: Amount
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class BudgetCreate(BaseModel):
     year: int
     category_id: str
-    monthly_target: float
+    monthly_target: Amount
 
 
 class Income(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    month: int
+    household_id: str = DEFAULT_HOUSEHOLD_ID
+    month: int = Field(ge=1, le=12)
     year: int
-    aposentadoria: float
-    salario: float
-    recursos_externos: float
+    aposentadoria: Amount
+    salario: Amount
+    recursos_externos: Amount
     notes: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class IncomeCreate(BaseModel):
-    month: int
+    month: int = Field(ge=1, le=12)
     year: int
-    aposentadoria: float
-    salario: float
-    recursos_externos: float
+    aposentadoria: Amount
+    salario: Amount
+    recursos_externos: Amount
     notes: Optional[str] = None
 
 
 class IncomeUpdate(BaseModel):
-    aposentadoria: Optional[float] = None
-    salario: Optional[float] = None
-    recursos_externos: Optional[float] = None
+    aposentadoria: Optional[Amount] = None
+    salario: Optional[Amount] = None
+    recursos_externos: Optional[Amount] = None
     notes: Optional[str] = None
 
 
+async def get_household_id(x_household_id: Optional[str] = Header(default=None)) -> str:
+    """Domicílio (tenant) da requisição; todas as consultas e escritas são restritas a ele"""
+    if x_household_id is None:
+        return DEFAULT_HOUSEHOLD_ID
+    household_id = x_household_id.strip()
+    if not household_id or len(household_id) > 64:
+        raise HTTPException(status_code=400, detail="Invalid X-Household-Id header")
+    return household_id
+
+
+def to_cents(value: float) -> int:
+    return int((Decimal(str(value)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents: int) -> float:
+    return int(cents) / 100
+
+
+def amounts_to_cents(doc: dict, fields: Dict[str, str]) -> dict:
+    """Converte os campos em reais de um documento para os campos em centavos armazenados"""
+    for field, cents_field in fields.items():
+        if field in doc:
+            doc[cents_field] = to_cents(doc.pop(field))
+    return doc
+
+
+def amounts_from_cents(doc: dict, fields: Dict[str, str]) -> dict:
+    for field, cents_field in fields.items():
+        if cents_field in doc:
+            doc[field] = from_cents(doc.pop(cents_field))
+    return doc
+
+
+def build_year_summary(
+    year: int,
+    categories: List[dict],
+    trans_month: np.ndarray,
+    trans_category: np.ndarray,
+    trans_planned: np.ndarray,
+    trans_actual: np.ndarray,
+    income_month: np.ndarray,
+    income_total: np.ndarray,
+) -> dict:
+    """Monta o resumo anual a partir de colunas int64 em centavos.
+
+    trans_category contém o índice da categoria em categories, ou -1 se ela não existir mais.
+    Linhas com mês fora de 1..12 são ignoradas, para que um documento inválido não derrube o resumo.
+    """
+    trans = (trans_month >= 1) & (trans_month <= 12)
+    trans_month, trans_category = trans_month[trans], trans_category[trans]
+    trans_planned, trans_actual = trans_planned[trans], trans_actual[trans]
+    incomes = (income_month >= 1) & (income_month <= 12)
+    income_month, income_total = income_month[incomes], income_total[incomes]
+    
+    monthly_planned = np.zeros(13, dtype=np.int64)
+    monthly_actual = np.zeros(13, dtype=np.int64)
+    monthly_income = np.zeros(13, dtype=np.int64)
+    np.add.at(monthly_planned, trans_month, trans_planned)
+    np.add.at(monthly_actual, trans_month, trans_actual)
+    np.add.at(monthly_income, income_month, income_total)
+    
+    known = trans_category >= 0
+    category_planned = np.zeros(len(categories), dtype=np.int64)
+    category_actual = np.zeros(len(categories), dtype=np.int64)
+    np.add.at(category_planned, trans_category[known], trans_planned[known])
+    np.add.at(category_actual, trans_category[known], trans_actual[known])
+    
+    total_actual = int(monthly_actual.sum())
+    total_income = int(monthly_income.sum())
+    
+    monthly_summary = {}
+    for month in range(1, 13):
+        monthly_summary[month] = {
+            "planned": from_cents(monthly_planned[month]),
+            "actual": from_cents(monthly_actual[month]),
+            "income": from_cents(monthly_income[month]),
+            "balance": from_cents(monthly_income[month] - monthly_actual[month])
+        }
+    
+    category_summary = {}
+    for idx, cat in enumerate(categories):
+        category_summary[cat['id']] = {
+            "name": cat['name'],
+            "planned": from_cents(category_planned[idx]),
+            "actual": from_cents(category_actual[idx]),
+            "color": cat['color']
+        }
+    
+    return {
+        "year": year,
+        "total_planned": from_cents(monthly_planned.sum()),
+        "total_actual": from_cents(total_actual),
+        "total_income": from_cents(total_income),
+        "balance": from_cents(total_income - total_actual),
+        "monthly_summary": monthly_summary,
+        "category_summary": category_summary
+    }
+
+
+class ColumnTable:
+    """Colunas NumPy de tamanho variável indexadas pelo id do documento"""
+    
+    def __init__(self, dtypes: Dict[str, type], capacity: int = 64):
+        self.dtypes = dtypes
+        self.size = 0
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.data = {name: np.zeros(capacity, dtype=dtype) for name, dtype in dtypes.items()}
+    
+    @classmethod
+    def from_rows(cls, dtypes: Dict[str, type], ids: List[str], columns: Dict[str, list]) -> "ColumnTable":
+        table = cls(dtypes, capacity=max(64, len(ids) * 2))
+        table.size = len(ids)
+        table.ids = list(ids)
+        table.rows = {doc_id: row for row, doc_id in enumerate(ids)}
+        for name, values in columns.items():
+            table.data[name][:len(values)] = values
+        return table
+    
+    @property
+    def capacity(self) -> int:
+        return next(iter(self.data.values())).shape[0]
+    
+    def column(self, name: str) -> np.ndarray:
+        return self.data[name][:self.size]
+    
+    def upsert(self, doc_id: str, values: dict):
+        row = self.rows.get(doc_id)
+        if row is None:
+            if self.size == self.capacity:
+                for name in self.data:
+                    self.data[name] = np.concatenate([self.data[name], np.zeros_like(self.data[name])])
+            row = self.size
+            self.size += 1
+            self.ids.append(doc_id)
+            self.rows[doc_id] = row
+        for name, value in values.items():
+            self.data[name][row] = value
+    
+    def remove(self, doc_id: str):
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            for column in self.data.values():
+                column[row] = column[last]
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+        self.ids.pop()
+        self.size -= 1
+    
+    def remove_where(self, mask: np.ndarray):
+        for doc_id in [self.ids[row] for row in np.flatnonzero(mask)]:
+            self.remove(doc_id)
+
+
+TRANSACTION_COLUMNS = {
+    "year": np.int32, "month": np.int8, "category": np.int32,
+    "planned_cents": np.int64, "actual_cents": np.int64,
+}
+INCOME_COLUMNS = {
+    "year": np.int32, "month": np.int8,
+    "aposentadoria_cents": np.int64, "salario_cents": np.int64, "recursos_externos_cents": np.int64,
+}
+
+
+class AnalyticsStore:
+    """Cópia colunar em memória de transações e receitas para as leituras analíticas.
+
+    O Mongo continua sendo a fonte da verdade: a cópia é carregada na inicialização, atualizada
+    pelos handlers de escrita e recarregada por completo se a verificação de consistência falhar.
+    """
+    
+    def __init__(self, household_id: str):
+        self.household_id = household_id
+        self.loaded = False
+        self.loaded_at: Optional[datetime] = None
+        # Última sequência do journal do domicílio refletida nas colunas
+        self.seq = 0
+        self.categories: Dict[str, dict] = {}
+        self.category_ids: List[str] = []
+        self.category_index: Dict[str, int] = {}
+        self.transactions = ColumnTable(TRANSACTION_COLUMNS)
+        self.incomes = ColumnTable(INCOME_COLUMNS)
+        self._pending: Optional[list] = None
+        self._loading: Optional[asyncio.Task] = None
+    
+    def _category_slot(self, category_id: str) -> int:
+        idx = self.category_index.get(category_id)
+        if idx is None:
+            idx = len(self.category_ids)
+            self.category_ids.append(category_id)
+            self.category_index[category_id] = idx
+        return idx
+    
+    def _apply(self, patch):
+        if not self.loaded and self._pending is None:
+            return
+        patch()
+        # Escritas concorrentes a uma recarga são reaplicadas sobre as colunas novas
+        if self._pending is not None:
+            self._pending.append(patch)
+    
+    async def load(self):
+        """Recarrega as colunas do Mongo; chamadas concorrentes aguardam a mesma recarga"""
+        if self._loading is None:
+            self._loading = asyncio.get_running_loop().create_task(self._load())
+        await asyncio.shield(self._loading)
+    
+    async def _load(self):
+        self._pending = []
+        try:
+            # Lida antes dos dados: escritas posteriores chegam pelos patches pendentes
+            self.seq = await current_sequence(self.household_id)
+            scope = {"household_id": self.household_id}
+            categories = await db.categories.find(scope, {"_id": 0}).to_list(None)
+            transactions = await db.transactions.find(
+                scope, {"_id": 0, "id": 1, "year": 1, "month": 1, "category_id": 1, "planned_cents": 1, "actual_cents": 1}
+            ).to_list(None)
+            incomes = await db.incomes.find(
+                scope, {"_id": 0, "id": 1, "year": 1, "month": 1, **{f: 1 for f in INCOME_AMOUNTS.values()}}
+            ).to_list(None)
+            
+            self.categories = {cat['id']: cat for cat in categories}
+            self.category_ids = []
+            self.category_index = {}
+            self.transactions = ColumnTable.from_rows(TRANSACTION_COLUMNS, [t['id'] for t in transactions], {
+                "year": [t['year'] for t in transactions],
+                "month": [t['month'] for t in transactions],
+                "category": [self._category_slot(t['category_id']) for t in transactions],
+                "planned_cents": [t.get('planned_cents', 0) for t in transactions],
+                "actual_cents": [t.get('actual_cents', 0) for t in transactions],
+            })
+            self.incomes = ColumnTable.from_rows(INCOME_COLUMNS, [i['id'] for i in incomes], {
+                "year": [i['year'] for i in incomes],
+                "month": [i['month'] for i in incomes],
+                **{f: [i.get(f, 0) for i in incomes] for f in INCOME_AMOUNTS.values()},
+            })
+            
+            for patch in self._pending:
+                patch()
+            self.loaded = True
+            self.loaded_at = datetime.now(timezone.utc)
+        finally:
+            self._pending = None
+            self._loading = None
+    
+    def advance(self, first_seq: int, last_seq: int):
+        """Marca as entradas do journal gravadas por esta instância como já aplicadas.
+
+        Uma lacuna significa que outra instância escreveu no domicílio: a sequência fica parada
+        e a próxima leitura recarrega a cópia.
+        """
+        def patch():
+            if first_seq <= self.seq + 1:
+                self.seq = max(self.seq, last_seq)
+        self._apply(patch)
+    
+    def put_category(self, doc: dict):
+        def patch():
+            self.categories[doc['id']] = doc
+        self._apply(patch)
+    
+    def remove_category(self, category_id: str):
+        def patch():
+            self.categories.pop(category_id, None)
+            idx = self.category_index.get(category_id)
+            if idx is not None:
+                self.transactions.remove_where(self.transactions.column("category") == idx)
+        self._apply(patch)
+    
+    def put_transaction(self, doc: dict):
+        self._apply(lambda: self.transactions.upsert(doc['id'], {
+            "year": doc['year'],
+            "month": doc['month'],
+            "category": self._category_slot(doc['category_id']),
+            "planned_cents": doc.get('planned_cents', 0),
+            "actual_cents": doc.get('actual_cents', 0),
+        }))
+    
+    def remove_transaction(self, transaction_id: str):
+        self._apply(lambda: self.transactions.remove(transaction_id))
+    
+    def reset_actual(self):
+        self._apply(lambda: self.transactions.column("actual_cents").fill(0))
+    
+    def put_income(self, doc: dict):
+        self._apply(lambda: self.incomes.upsert(doc['id'], {
+            "year": doc['year'],
+            "month": doc['month'],
+            **{f: doc.get(f, 0) for f in INCOME_AMOUNTS.values()},
+        }))
+    
+    def remove_income(self, income_id: str):
+        self._apply(lambda: self.incomes.remove(income_id))
+    
+    def _income_total(self) -> np.ndarray:
+        return sum(self.incomes.column(f) for f in INCOME_AMOUNTS.values())
+    
+    def year_summary(self, year: int) -> dict:
+        categories = sorted(self.categories.values(), key=lambda cat: cat['order'])
+        # Converte o índice interno de categoria para a posição na lista ordenada (-1 se removida)
+        positions = np.full(len(self.category_ids) + 1, -1, dtype=np.int64)
+        for pos, cat in enumerate(categories):
+            idx = self.category_index.get(cat['id'])
+            if idx is not None:
+                positions[idx] = pos
+        
+        trans = self.transactions.column("year") == year
+        incomes = self.incomes.column("year") == year
+        return build_year_summary(
+            year,
+            categories,
+            self.transactions.column("month")[trans].astype(np.int64),
+            positions[self.transactions.column("category")[trans]],
+            self.transactions.column("planned_cents")[trans],
+            self.transactions.column("actual_cents")[trans],
+            self.incomes.column("month")[incomes].astype(np.int64),
+            self._income_total()[incomes],
+        )
+    
+    def category_breakdown(self, year: int) -> Dict[str, dict]:
+        months = self.transactions.column("month").astype(np.int64)
+        # Meses fora de 1..12 cairiam em dezembro (índice -1) ou fora da matriz
+        trans = (self.transactions.column("year") == year) & (months >= 1) & (months <= 12)
+        months = months[trans] - 1
+        slots = self.transactions.column("category")[trans].astype(np.int64)
+        planned = np.zeros((len(self.category_ids), 12), dtype=np.int64)
+        actual = np.zeros((len(self.category_ids), 12), dtype=np.int64)
+        np.add.at(planned, (slots, months), self.transactions.column("planned_cents")[trans])
+        np.add.at(actual, (slots, months), self.transactions.column("actual_cents")[trans])
+        
+        breakdown = {}
+        for cat in sorted(self.categories.values(), key=lambda cat: cat['order']):
+            idx = self.category_index.get(cat['id'])
+            breakdown[cat['id']] = {
+                "name": cat['name'],
+                "color": cat['color'],
+                "planned": [from_cents(v) for v in planned[idx]] if idx is not None else [0.0] * 12,
+                "actual": [from_cents(v) for v in actual[idx]] if idx is not None else [0.0] * 12,
+            }
+        return breakdown
+    
+    def trends(self, start_year: int, end_year: int) -> List[dict]:
+        span = (end_year - start_year + 1) * 12
+        
+        def monthly(table: ColumnTable, values: np.ndarray) -> np.ndarray:
+            idx = (table.column("year").astype(np.int64) - start_year) * 12 + table.column("month") - 1
+            inside = (idx >= 0) & (idx < span)
+            totals = np.zeros(span, dtype=np.int64)
+            np.add.at(totals, idx[inside], values[inside])
+            return totals
+        
+        planned = monthly(self.transactions, self.transactions.column("planned_cents"))
+        actual = monthly(self.transactions, self.transactions.column("actual_cents"))
+        income = monthly(self.incomes, self._income_total())
+        
+        return [
+            {
+                "year": start_year + i // 12,
+                "month": i % 12 + 1,
+                "planned": from_cents(planned[i]),
+                "actual": from_cents(actual[i]),
+                "income": from_cents(income[i]),
+                "balance": from_cents(income[i] - actual[i]),
+            }
+            for i in range(span)
+        ]
+    
+    def category_fingerprint(self) -> List[tuple]:
+        return category_fingerprint(self.categories.values())
+    
+    def transaction_groups(self) -> Dict[tuple, tuple]:
+        """Contagem e somas por (ano, mês, categoria) das colunas residentes"""
+        slots = self.transactions.column("category")
+        categories = np.array(self.category_ids + [None], dtype=object)[slots]
+        return group_sums(
+            zip(self.transactions.column("year").tolist(), self.transactions.column("month").tolist(), categories),
+            self.transactions.column("planned_cents").tolist(),
+            self.transactions.column("actual_cents").tolist(),
+        )
+    
+    def income_groups(self) -> Dict[tuple, tuple]:
+        return group_sums(
+            zip(self.incomes.column("year").tolist(), self.incomes.column("month").tolist()),
+            self._income_total().tolist(),
+        )
+    
+    async def verify(self) -> dict:
+        """Compara sequência do journal, categorias e somas por (ano, mês, categoria) com o Mongo.
+
+        Recarrega tudo se houver divergência.
+        """
+        scope = {"household_id": self.household_id}
+        seq = await current_sequence(self.household_id)
+        categories = await db.categories.find(scope, {"_id": 0, "id": 1, "name": 1, "color": 1, "order": 1}).to_list(None)
+        trans = await db.transactions.aggregate([{"$match": scope}, {"$group": {
+            "_id": {"year": "$year", "month": "$month", "category_id": "$category_id"},
+            "count": {"$sum": 1},
+            "planned": {"$sum": "$planned_cents"}, "actual": {"$sum": "$actual_cents"}
+        }}]).to_list(None)
+        incomes = await db.incomes.aggregate([{"$match": scope}, {"$group": {
+            "_id": {"year": "$year", "month": "$month"},
+            "count": {"$sum": 1},
+            "total": {"$sum": {"$add": [f"${f}" for f in INCOME_AMOUNTS.values()]}}
+        }}]).to_list(None)
+        
+        expected_trans = {
+            (g['_id']['year'], g['_id']['month'], g['_id']['category_id']): (g['count'], g['planned'], g['actual'])
+            for g in trans
+        }
+        expected_incomes = {(g['_id']['year'], g['_id']['month']): (g['count'], g['total']) for g in incomes}
+        current_trans = self.transaction_groups()
+        current_incomes = self.income_groups()
+        
+        differences = []
+        if seq != self.seq:
+            differences.append("journal")
+        if category_fingerprint(categories) != self.category_fingerprint():
+            differences.append("categories")
+        for key in sorted(set(expected_trans) | set(current_trans), key=str):
+            if expected_trans.get(key) != current_trans.get(key):
+                differences.append("transactions {}-{:02d} {}".format(*key))
+        for key in sorted(set(expected_incomes) | set(current_incomes)):
+            if expected_incomes.get(key) != current_incomes.get(key):
+                differences.append("incomes {}-{:02d}".format(*key))
+        
+        report = {
+            "consistent": self.loaded and not differences,
+            "expected": {
+                "seq": seq,
+                "categories": len(categories),
+                "transactions": sum(group[0] for group in expected_trans.values()),
+                "incomes": sum(group[0] for group in expected_incomes.values()),
+            },
+            "store": {
+                "seq": self.seq,
+                "categories": len(self.categories),
+                "transactions": self.transactions.size,
+                "incomes": self.incomes.size,
+            },
+            "differences": differences[:VERIFY_MAX_DIFFERENCES],
+        }
+        if not report["consistent"]:
+            await self.load()
+        
+        return report
+
+
+def category_fingerprint(categories) -> List[tuple]:
+    """Conteúdo das categorias que aparece nos resumos, em ordem estável"""
+    return sorted((cat['id'], cat['name'], cat['color'], cat['order']) for cat in categories)
+
+
+def group_sums(keys, *columns) -> Dict[tuple, tuple]:
+    """Agrupa linhas por chave em (contagem, soma de cada coluna)"""
+    groups: Dict[tuple, list] = {}
+    for key, *values in zip(keys, *columns):
+        group = groups.setdefault(tuple(key), [0] + [0] * len(values))
+        group[0] += 1
+        for i, value in enumerate(values, start=1):
+            group[i] += int(value)
+    return {key: tuple(group) for key, group in groups.items()}
+
+
+_analytics_stores: "OrderedDict[str, AnalyticsStore]" = OrderedDict()
+
+
+def analytics_for(household_id: str) -> AnalyticsStore:
+    """Cópia residente do domicílio; se não houver, um store descarregado que ignora as atualizações"""
+    return _analytics_stores.get(household_id) or AnalyticsStore(household_id)
+
+
+async def load_analytics(household_id: str) -> AnalyticsStore:
+    store = _analytics_stores.get(household_id)
+    if store is None:
+        store = AnalyticsStore(household_id)
+        _analytics_stores[household_id] = store
+        while len(_analytics_stores) > ANALYTICS_MAX_HOUSEHOLDS:
+            _analytics_stores.popitem(last=False)
+    _analytics_stores.move_to_end(household_id)
+    
+    # Outra instância escreveu no domicílio desde a carga: a sequência do journal avançou sem esta cópia
+    if not store.loaded or await current_sequence(household_id) > store.seq:
+        await store.load()
+    return store
+
+
+def month_index(year: int, month: int) -> int:
+    return year * 12 + (month - 1)
+
+
+def month_range(start_year: int, start_month: int, end_year: int, end_month: int) -> List[Tuple[int, int]]:
+    start = month_index(start_year, start_month)
+    end = month_index(end_year, end_month)
+    return [(idx // 12, idx % 12 + 1) for idx in range(start, end + 1)]
+
+
+def recurrence_amount(rule: dict, year: int, month: int) -> Optional[float]:
+    """Valor planejado da regra para o mês, ou None se o mês estiver fora da vigência"""
+    idx = month_index(year, month)
+    start = month_index(rule['start_year'], rule['start_month'])
+    if idx < start:
+        return None
+    if rule.get('end_year') is not None:
+        end = month_index(rule['end_year'], rule.get('end_month') or 12)
+        if idx > end:
+            return None
+    
+    amount = rule['amount']
+    if rule.get('annual_adjustment'):
+        amount *= (1 + rule['annual_adjustment'] / 100) ** ((idx - start) // 12)
+    return round(amount, 2)
+
+
+# Meses já materializados neste processo; evita consultar recurrence_runs a cada leitura
+_materialized_months: set = set()
+
+
+# Serializa a verificação e a geração de cada (domicílio, ano) dentro do processo
+_generation_locks: Dict[Tuple[str, int], asyncio.Lock] = {}
+DUPLICATE_KEY_ERROR = 11000
+
+
+def generation_lock(household_id: str, year: int) -> asyncio.Lock:
+    return _generation_locks.setdefault((household_id, year), asyncio.Lock())
+
+
+def require_valid_months(months: List[int]):
+    """A geração grava documentos: um mês fora de 1..12 nunca pode chegar ao banco"""
+    invalid = sorted({month for month in months if not 1 <= month <= 12})
+    if invalid:
+        raise ValueError(f"Invalid months for recurrence generation: {invalid}")
+
+
+def recurrence_key(category_id: str, year: int, month: int) -> str:
+    return f"{category_id}:{year}-{month:02d}"
+
+
+async def generate_recurring_transactions(household_id: str, months: List[Tuple[int, int]]) -> int:
+    """Materializa as transações planejadas das categorias recorrentes em um único bulk upsert.
+
+    Meses que já possuem transação para a categoria são mantidos como estão.
+    """
+    years = sorted({year for year, _ in months})
+    locks = [generation_lock(household_id, year) for year in years]
+    for lock in locks:
+        await lock.acquire()
+    try:
+        return await materialize_recurring(household_id, months)
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+
+
+async def materialize_recurring(household_id: str, months: List[Tuple[int, int]]) -> int:
+    """Executa a geração; quem chama deve manter o generation_lock dos anos envolvidos"""
+    require_valid_months([month for _, month in months])
+    categories = await db.categories.find(
+        {"household_id": household_id, "recurrence": {"$ne": None}},
+        {"_id": 0, "id": 1, "recurrence": 1}
+    ).to_list(1000)
+    
+    operations = []
+    docs = []
+    for cat in categories:
+        for year, month in months:
+            amount = recurrence_amount(cat['recurrence'], year, month)
+            if amount is None:
+                continue
+            
+            transaction = Transaction(
+                household_id=household_id,
+                category_id=cat['id'],
+                month=month,
+                year=year,
+                planned_value=amount,
+                actual_value=0,
+                notes=RECURRING_NOTES
+            )
+            doc = amounts_to_cents(transaction.model_dump(), TRANSACTION_AMOUNTS)
+            doc['created_at'] = doc['created_at'].isoformat()
+            doc['updated_at'] = doc['updated_at'].isoformat()
+            # Chave única (índice parcial) que impede duplicatas entre instâncias concorrentes
+            doc['recurrence_key'] = recurrence_key(cat['id'], year, month)
+            docs.append(doc)
+            operations.append(UpdateOne(
+                {"household_id": household_id, "category_id": cat['id'], "year": year, "month": month},
+                {"$setOnInsert": doc},
+                upsert=True
+            ))
+    
+    created = 0
+    if operations:
+        try:
+            result = await db.transactions.bulk_write(operations, ordered=False)
+            upserted = list(result.upserted_ids)
+        except BulkWriteError as exc:
+            # Outra instância gerou o mesmo mês ao mesmo tempo: as duplicatas são descartadas
+            if any(error['code'] != DUPLICATE_KEY_ERROR for error in exc.details['writeErrors']):
+                raise
+            upserted = [item['index'] for item in exc.details['upserted']]
+        created = len(upserted)
+        store = analytics_for(household_id)
+        for op_index in upserted:
+            store.put_transaction(docs[op_index])
+        await record_changes(household_id, [
+            journal_put("transactions", docs[op_index]) for op_index in upserted
+        ])
+    
+    if months:
+        generated_at = datetime.now(timezone.utc).isoformat()
+        await db.recurrence_runs.bulk_write([
+            UpdateOne(
+                {"household_id": household_id, "year": year, "month": month},
+                {"$set": {"generated_at": generated_at}},
+                upsert=True
+            )
+            for year, month in months
+        ], ordered=False)
+        _materialized_months.update((household_id, year, month) for year, month in months)
+    
+    return created
+
+
+async def migrate_amounts_to_cents(batch_size: int = MIGRATION_BATCH_SIZE) -> Dict[str, int]:
+    """Converte, em lotes, os valores legados em float para centavos inteiros"""
+    migrated = {}
+    for collection, fields in ((db.transactions, TRANSACTION_AMOUNTS), (db.incomes, INCOME_AMOUNTS)):
+        legacy = {"$or": [{field: {"$exists": True}} for field in fields]}
+        projection = {"_id": 1, **{field: 1 for field in fields}}
+        count = 0
+        operations = []
+        
+        # Um único cursor em ordem de _id: documentos já convertidos não são relidos a cada lote
+        cursor = collection.find(legacy, projection).sort("_id", ASCENDING).batch_size(batch_size)
+        async for doc in cursor:
+            present = [field for field in fields if field in doc]
+            operations.append(UpdateOne(
+                {"_id": doc['_id']},
+                {
+                    "$set": {fields[field]: to_cents(doc[field] or 0) for field in present},
+                    "$unset": {field: "" for field in present}
+                }
+            ))
+            if len(operations) >= batch_size:
+                await collection.bulk_write(operations, ordered=False)
+                count += len(operations)
+                operations = []
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+            count += len(operations)
+        
+        migrated[collection.name] = count
+    
+    if any(migrated.values()):
+        for store in list(_analytics_stores.values()):
+            await store.load()
+    
+    return migrated
+
+
+TRANSACTION_ROW_FIELDS = ("month", "category_id", "planned_cents", "actual_cents")
+INCOME_ROW_FIELDS = ("month", *INCOME_AMOUNTS.values())
+JOURNAL_ROW_FIELDS = {"transactions": TRANSACTION_ROW_FIELDS, "incomes": INCOME_ROW_FIELDS}
+
+# Contador global usado antes de as sequências do journal serem separadas por domicílio
+LEGACY_JOURNAL_COUNTER = "journal"
+
+# Contagem de entradas por (domicílio, ano) desde o último snapshot neste processo
+_journal_since_snapshot: Dict[Tuple[str, int], int] = {}
+
+
+def journal_put(collection: str, doc: dict) -> dict:
+    return {
+        "collection": collection,
+        "op": "put",
+        "doc_id": doc['id'],
+        "year": doc['year'],
+        "row": {field: doc.get(field) for field in JOURNAL_ROW_FIELDS[collection]},
+    }
+
+
+def journal_category(doc: dict) -> dict:
+    """Categorias não entram na reconstrução histórica; a entrada só avança a sequência do domicílio"""
+    return {"collection": "categories", "op": "put", "doc_id": doc['id'], "year": None}
+
+
+def journal_delete(collection: str, doc: dict) -> dict:
+    return {"collection": collection, "op": "delete", "doc_id": doc['id'], "year": doc['year']}
+
+
+async def next_sequence(household_id: str, count: int = 1) -> int:
+    """Reserva `count` números no contador do journal do domicílio e devolve o último"""
+    counter = await db.counters.find_one_and_update(
+        {"_id": household_id},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq']
+
+
+async def current_sequence(household_id: str) -> int:
+    counter = await db.counters.find_one({"_id": household_id})
+    return counter['seq'] if counter else 0
+
+
+async def record_changes(household_id: str, entries: List[dict]):
+    """Acrescenta as mutações ao journal com números de sequência contíguos"""
+    if not entries:
+        return
+    
+    last_seq = await next_sequence(household_id, len(entries))
+    first_seq = last_seq - len(entries) + 1
+    store = _analytics_stores.get(household_id)
+    if store is not None:
+        store.advance(first_seq, last_seq)
+    ts = datetime.now(timezone.utc)
+    for offset, entry in enumerate(entries):
+        entry['household_id'] = household_id
+        entry['seq'] = first_seq + offset
+        entry['ts'] = ts
+    
+    await db.journal.insert_many(entries)
+    
+    for year in {entry['year'] for entry in entries if entry['year'] is not None}:
+        key = (household_id, year)
+        _journal_since_snapshot[key] = _journal_since_snapshot.get(key, 0) + sum(
+            1 for entry in entries if entry['year'] == year
+        )
+        if _journal_since_snapshot[key] >= JOURNAL_SNAPSHOT_EVERY:
+            await take_snapshot(household_id, year)
+            await prune_journal(household_id, year, JOURNAL_KEEP_SNAPSHOTS)
+
+
+async def take_snapshot(household_id: str, year: int, base: bool = False) -> dict:
+    # A sequência é lida antes dos dados: entradas posteriores são reaplicadas sobre o snapshot
+    seq = await current_sequence(household_id)
+    
+    snapshot = {"household_id": household_id, "year": year, "seq": seq, "ts": datetime.now(timezone.utc), "base": base}
+    for collection, fields in JOURNAL_ROW_FIELDS.items():
+        docs = await db[collection].find(
+            {"household_id": household_id, "year": year},
+            {"_id": 0, "id": 1, **{field: 1 for field in fields}}
+        ).to_list(None)
+        snapshot[collection] = docs
+    
+    await db.snapshots.insert_one(snapshot)
+    _journal_since_snapshot[(household_id, year)] = 0
+    return snapshot
+
+
+async def prune_journal(household_id: str, year: int, keep: int) -> Tuple[int, int]:
+    """Mantém os `keep` snapshots mais recentes do ano e descarta o histórico anterior ao mais antigo deles"""
+    keep = max(1, keep)
+    scope = {"household_id": household_id, "year": year}
+    snapshots = await db.snapshots.find(
+        scope, {"_id": 1, "seq": 1}
+    ).sort("seq", -1).to_list(None)
+    if len(snapshots) <= keep:
+        return 0, 0
+    
+    base = snapshots[keep - 1]
+    await db.snapshots.update_one({"_id": base['_id']}, {"$set": {"base": True}})
+    deleted_snapshots = await db.snapshots.delete_many({**scope, "seq": {"$lt": base['seq']}})
+    deleted_entries = await db.journal.delete_many({**scope, "seq": {"$lte": base['seq']}})
+    
+    return deleted_entries.deleted_count, deleted_snapshots.deleted_count
+
+
+async def household_years(collection) -> set:
+    groups = await collection.aggregate([
+        {"$group": {"_id": {"household_id": "$household_id", "year": "$year"}}}
+    ]).to_list(None)
+    return {(g['_id']['household_id'], g['_id']['year']) for g in groups if g['_id'].get('year') is not None}
+
+
+async def bootstrap_snapshots() -> int:
+    """Cria o snapshot base dos anos que ainda não têm histórico no journal"""
+    years = await household_years(db.transactions) | await household_years(db.incomes)
+    covered = await household_years(db.snapshots)
+    for household_id, year in sorted(years - covered):
+        await take_snapshot(household_id, year, base=True)
+    return len(years - covered)
+
+
+async def compact_journal(household_id: str, keep: Optional[int] = None) -> dict:
+    keep = max(1, keep or JOURNAL_KEEP_SNAPSHOTS)
+    scope = {"household_id": household_id}
+    years = set(await db.transactions.distinct("year", scope))
+    years |= set(await db.incomes.distinct("year", scope))
+    years |= {year for year in await db.journal.distinct("year", scope) if year is not None}
+    
+    deleted_entries = 0
+    deleted_snapshots = 0
+    for year in sorted(years):
+        await take_snapshot(household_id, year)
+        entries, snapshots = await prune_journal(household_id, year, keep)
+        deleted_entries += entries
+        deleted_snapshots += snapshots
+    
+    # Entradas sem ano (reset, remoção de categoria) só podem sair quando nenhum ano precisar delas
+    floors = []
+    for year in years:
+        oldest = await db.snapshots.find({**scope, "year": year}, {"seq": 1}).sort("seq", 1).limit(1).to_list(1)
+        floors.append(oldest[0]['seq'] if oldest else 0)
+    if floors:
+        result = await db.journal.delete_many({**scope, "year": None, "seq": {"$lte": min(floors)}})
+        deleted_entries += result.deleted_count
+    
+    return {
+        "years": sorted(years),
+        "deleted_entries": deleted_entries,
+        "deleted_snapshots": deleted_snapshots
+    }
+
+
+async def year_summary_as_of(household_id: str, year: int, as_of: datetime) -> dict:
+    """Reconstrói o resumo do ano no instante `as_of` a partir do snapshot mais próximo e dos deltas seguintes"""
+    if as_of.tzinfo is None:
+        as_of = as_of.replace(tzinfo=timezone.utc)
+    
+    scope = {"household_id": household_id}
+    snapshots = await db.snapshots.find(
+        {**scope, "year": year, "ts": {"$lte": as_of}}, {"_id": 0}
+    ).sort("seq", -1).limit(1).to_list(1)
+    
+    if snapshots:
+        snapshot = snapshots[0]
+    else:
+        if await db.snapshots.count_documents({**scope, "year": year, "base": True}) > 0:
+            raise HTTPException(status_code=400, detail="History before the oldest snapshot was compacted")
+        snapshot = {"seq": 0, "transactions": [], "incomes": []}
+    
+    rows = {
+        collection: {doc['id']: doc for doc in snapshot[collection]}
+        for collection in JOURNAL_ROW_FIELDS
+    }
+    
+    entries = db.journal.find(
+        {**scope, "year": {"$in": [year, None]}, "seq": {"$gt": snapshot['seq']}, "ts": {"$lte": as_of}},
+        {"_id": 0}
+    ).sort("seq", 1)
+    async for entry in entries:
+        table = rows.get(entry['collection'])
+        if table is None:
+            continue
+        if entry['op'] == "put":
+            table[entry['doc_id']] = entry['row']
+        elif entry['op'] == "delete":
+            table.pop(entry['doc_id'], None)
+        elif entry['op'] == "reset_actual":
+            for row in table.values():
+                row['actual_cents'] = 0
+        elif entry['op'] == "delete_category":
+            for doc_id in [k for k, row in table.items() if row['category_id'] == entry['category_id']]:
+                del table[doc_id]
+    
+    categories = await db.categories.find(scope, {"_id": 0}).sort("order", 1).to_list(1000)
+    category_index = {cat['id']: idx for idx, cat in enumerate(categories)}
+    transactions = list(rows["transactions"].values())
+    incomes = list(rows["incomes"].values())
+    
+    return build_year_summary(
+        year,
+        categories,
+        np.array([t['month'] for t in transactions], dtype=np.int64),
+        np.array([category_index.get(t['category_id'], -1) for t in transactions], dtype=np.int64),
+        np.array([t['planned_cents'] for t in transactions], dtype=np.int64),
+        np.array([t['actual_cents'] for t in transactions], dtype=np.int64),
+        np.array([i['month'] for i in incomes], dtype=np.int64),
+        np.array([sum(i[f] for f in INCOME_AMOUNTS.values()) for i in incomes], dtype=np.int64),
+    )
+
+
+async def ensure_recurring_materialized(household_id: str, year: int, months: List[int]):
+    """Gera as recorrências na primeira vez em que um mês é consultado"""
+    require_valid_months(months)
+    if all((household_id, year, m) in _materialized_months for m in months):
+        return
+    
+    async with generation_lock(household_id, year):
+        # Reavaliado sob o lock: outra leitura pode ter gerado os meses enquanto esperávamos
+        pending = [m for m in months if (household_id, year, m) not in _materialized_months]
+        if not pending:
+            return
+        
+        runs = await db.recurrence_runs.find(
+            {"household_id": household_id, "year": year, "month": {"$in": pending}},
+            {"_id": 0, "month": 1}
+        ).to_list(12)
+        done = {run['month'] for run in runs}
+        _materialized_months.update((household_id, year, m) for m in done)
+        
+        missing = [(year, m) for m in pending if m not in done]
+        if missing:
+            await materialize_recurring(household_id, missing)
+
+
+async def invalidate_recurrence_runs(household_id: str, rule: Optional[RecurrenceRule]):
+    """Permite que a geração preguiçosa alcance meses já visitados após mudança de regra"""
+    if rule is None:
+        return
+    
+    await db.recurrence_runs.delete_many({"household_id": household_id, "$or": [
+        {"year": {"$gt": rule.start_year}},
+        {"year": rule.start_year, "month": {"$gte": rule.start_month}}
+    ]})
+    for key in [key for key in _materialized_months if key[0] == household_id]:
+        _materialized_months.discard(key)
+
+
+TENANT_COLLECTIONS = ("categories", "transactions", "budgets", "incomes", "recurrence_runs", "journal", "snapshots")
+
+
+async def migrate_households() -> Dict[str, int]:
+    """Atribui ao domicílio padrão os documentos criados antes da separação por domicílio"""
+    migrated = {}
+    for name in TENANT_COLLECTIONS:
+        result = await db[name].update_many(
+            {"household_id": {"$exists": False}},
+            {"$set": {"household_id": DEFAULT_HOUSEHOLD_ID}}
+        )
+        migrated[name] = result.modified_count
+    return migrated
+
+
+async def migrate_journal_counters() -> int:
+    """Substitui o contador global do journal por um contador por domicílio.
+
+    Cada domicílio que já tem histórico parte do valor global, maior que qualquer sequência gravada.
+    """
+    legacy = await db.counters.find_one({"_id": LEGACY_JOURNAL_COUNTER})
+    if legacy is None:
+        return 0
+    
+    households = set(await db.journal.distinct("household_id")) | set(await db.snapshots.distinct("household_id"))
+    for household_id in households:
+        await db.counters.update_one({"_id": household_id}, {"$max": {"seq": legacy['seq']}}, upsert=True)
+    await db.counters.delete_one({"_id": LEGACY_JOURNAL_COUNTER})
+    return len(households)
+
+
+async def ensure_indexes():
+    """Índices compostos iniciados por household_id, compatíveis com household_id como shard key"""
+    h = ("household_id", ASCENDING)
+    await db.categories.create_index([h, ("id", ASCENDING)], unique=True)
+    await db.categories.create_index([h, ("order", ASCENDING)])
+    await db.transactions.create_index([h, ("id", ASCENDING)], unique=True)
+    await db.transactions.create_index([h, ("year", ASCENDING), ("month", ASCENDING)])
+    await db.transactions.create_index([h, ("category_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)])
+    await db.transactions.create_index(
+        [h, ("recurrence_key", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"recurrence_key": {"$exists": True}}
+    )
+    await db.transactions.create_index([h, ("planned_cents", ASCENDING)])
+    await db.transactions.create_index([h, ("actual_cents", ASCENDING)])
+    await db.transactions.create_index([h, ("notes", TEXT)], default_language="portuguese")
+    await db.budgets.create_index([h, ("id", ASCENDING)], unique=True)
+    await db.budgets.create_index([h, ("year", ASCENDING)])
+    await db.incomes.create_index([h, ("id", ASCENDING)], unique=True)
+    await db.incomes.create_index([h, ("year", ASCENDING), ("month", ASCENDING)])
+    await db.recurrence_runs.create_index([h, ("year", ASCENDING), ("month", ASCENDING)], unique=True)
+    await db.journal.create_index([h, ("year", ASCENDING), ("seq", ASCENDING)])
+    await db.snapshots.create_index([h, ("year", ASCENDING), ("seq", ASCENDING)])
+
+
+async def stream_backup(household_id: str, year: Optional[int] = None):
+    """Gera o backup do domicílio como NDJSON comprimido em gzip, direto dos cursores do Motor"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    buffer = []
+    size = 0
+    
+    for collection in BACKUP_COLLECTIONS:
+        query = {"household_id": household_id}
+        if year is not None and collection != "categories":
+            query["year"] = year
+        
+        async for doc in db[collection].find(query, {"_id": 0}).batch_size(1000):
+            line = json.dumps({"collection": collection, "doc": doc}, default=str, ensure_ascii=False) + "\n"
+            buffer.append(line.encode())
+            size += len(buffer[-1])
+            if size >= BACKUP_FLUSH_BYTES:
+                chunk = compressor.compress(b"".join(buffer))
+                buffer, size = [], 0
+                if chunk:
+                    yield chunk
+    
+    yield compressor.compress(b"".join(buffer)) + compressor.flush()
+
+
+BACKUP_MODELS = {
+    "categories": (Category, {}),
+    "transactions": (Transaction, TRANSACTION_AMOUNTS),
+    "incomes": (Income, INCOME_AMOUNTS),
+    "budgets": (Budget, {}),
+}
+
+
+def valid_backup_doc(collection: str, doc) -> bool:
+    """Valida o documento armazenado contra o modelo da API da coleção.
+
+    Os valores precisam estar em centavos inteiros: é assim que a cópia analítica, os snapshots
+    e o journal os leem, sem outra checagem.
+    """
+    def is_int(value) -> bool:
+        return isinstance(value, int) and not isinstance(value, bool)
+    
+    model, amounts = BACKUP_MODELS[collection]
+    if not isinstance(doc, dict) or not isinstance(doc.get('id'), str) or not doc['id']:
+        return False
+    # O modelo aceitaria "2026" como ano; no banco o campo precisa ser inteiro para filtros e ordenação
+    if any(not is_int(doc.get(field)) for field in ("year", "month", "order") if field in model.model_fields):
+        return False
+    for cents_field in amounts.values():
+        cents = doc.get(cents_field)
+        if not is_int(cents) or abs(cents) > MAX_AMOUNT * 100:
+            return False
+    # Levanta ValidationError (um ValueError) para campos ausentes, de tipo errado ou fora da faixa
+    model.model_validate(amounts_from_cents(dict(doc), amounts))
+    return True
+
+
+async def restore_backup(household_id: str, chunks, year: Optional[int] = None) -> Dict[str, int]:
+    """Restaura um backup NDJSON/gzip em lotes de bulk_write não ordenados com upsert por id"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    pending: Dict[str, list] = {collection: [] for collection in BACKUP_COLLECTIONS}
+    restored = {collection: 0 for collection in BACKUP_COLLECTIONS}
+    restored["skipped"] = 0
+    years = set()
+    partial = b""
+    line_number = 0
+    
+    async def flush(collection: str):
+        if pending[collection]:
+            await db[collection].bulk_write(pending[collection], ordered=False)
+            restored[collection] += len(pending[collection])
+            pending[collection] = []
+    
+    async def handle(raw: bytes):
+        nonlocal line_number
+        line_number += 1
+        if not raw.strip():
+            return
+        try:
+            record = json.loads(raw)
+            collection, doc = record['collection'], record['doc']
+            if collection in pending and not valid_backup_doc(collection, doc):
+                raise ValueError(collection)
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail=f"Invalid backup record at line {line_number}")
+        
+        if collection not in pending or (year is not None and doc.get('year', year) != year):
+            restored["skipped"] += 1
+            return
+        
+        doc['household_id'] = household_id
+        if collection in JOURNAL_ROW_FIELDS:
+            years.add(doc['year'])
+        pending[collection].append(ReplaceOne({"household_id": household_id, "id": doc['id']}, doc, upsert=True))
+        if len(pending[collection]) >= RESTORE_CHUNK_SIZE:
+            await flush(collection)
+    
+    try:
+        async for chunk in chunks:
+            lines = (partial + decompressor.decompress(chunk)).split(b"\n")
+            partial = lines.pop()
+            for raw in lines:
+                await handle(raw)
+        lines = (partial + decompressor.flush()).split(b"\n")
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Backup is not a valid gzip stream")
+    for raw in lines:
+        await handle(raw)
+    
+    for collection in BACKUP_COLLECTIONS:
+        await flush(collection)
+    
+    # Restauração não passa pelo journal: novos snapshots registram o estado restaurado, e o avanço
+    # da sequência faz as cópias analíticas das outras instâncias recarregarem na próxima leitura
+    await next_sequence(household_id)
+    for restored_year in sorted(years):
+        await take_snapshot(household_id, restored_year)
+    store = _analytics_stores.get(household_id)
+    if store is not None:
+        await store.load()
+    for key in [key for key in _materialized_months if key[0] == household_id]:
+        _materialized_months.discard(key)
+    
+    return restored
+
+
+class SingleFlight:
+    """Coalesce leituras idênticas concorrentes.
+
+    Requisições com o mesmo endpoint, domicílio e parâmetros normalizados aguardam a mesma
+    computação em andamento em vez de repetir as consultas. Escritas de um domicílio descartam
+    as computações em andamento dele, para que leituras posteriores não recebam dados antigos.
+    """
+    
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        # Limite por (endpoint, domicílio): um domicílio com muitas leituras distintas não atrasa os outros
+        self._limits: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+        self._limit_users: Dict[Tuple[str, str], int] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+    
+    async def run(self, endpoint: str, household_id: str, params: dict, compute):
+        key = (endpoint, household_id, tuple(sorted((k, v) for k, v in params.items() if v is not None)))
+        stats = self.stats.setdefault(endpoint, {"executed": 0, "coalesced": 0})
+        
+        task = self._inflight.get(key)
+        if task is None:
+            stats["executed"] += 1
+            task = asyncio.ensure_future(self._execute(endpoint, key, compute))
+            self._inflight[key] = task
+        else:
+            stats["coalesced"] += 1
+        
+        # shield: o cancelamento de um cliente não interrompe a computação dos demais
+        return await asyncio.shield(task)
+    
+    async def _execute(self, endpoint: str, key: tuple, compute):
+        scope = (endpoint, key[1])
+        limit = self._limits.setdefault(scope, asyncio.Semaphore(self.max_concurrency))
+        self._limit_users[scope] = self._limit_users.get(scope, 0) + 1
+        try:
+            async with limit:
+                return await compute()
+        finally:
+            self._limit_users[scope] -= 1
+            if not self._limit_users[scope]:
+                del self._limit_users[scope]
+                del self._limits[scope]
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+    
+    def invalidate(self, household_id: str):
+        for key in [key for key in self._inflight if key[1] == household_id]:
+            del self._inflight[key]
+    
+    def snapshot(self) -> Dict[str, dict]:
+        return {
+            endpoint: {
+                **counts,
+                "inflight": sum(1 for key in self._inflight if key[0] == endpoint)
+            }
+            for endpoint, counts in self.stats.items()
+        }
+
+
+coalescer = SingleFlight(COALESCE_MAX_CONCURRENCY)
+
+
 @api_router.get("/")
 async def root():
     return {"message": "Finance Control API"}
 
 
+@api_router.get("/health")
+async def health():
+    """Liveness: o processo está de pé, sem consultar o banco"""
+    return {"status": "ok"}
+
+
+@api_router.get("/ready")
+async def ready():
+    """Readiness: inicialização concluída e banco acessível"""
+    body = {
+        "ready": service_state["ready"],
+        "started_at": service_state["started_at"],
+        "startup_duration_ms": service_state["startup_duration_ms"],
+        "pool": {
+            "max_size": MONGO_CLIENT_OPTIONS["maxPoolSize"],
+            "min_size": MONGO_CLIENT_OPTIONS["minPoolSize"],
+            **pool_stats.snapshot()
+        },
+    }
+    if not service_state["ready"]:
+        return JSONResponse(status_code=503, content=body)
+    
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout=READINESS_PING_TIMEOUT)
+    except Exception as exc:
+        body["ready"] = False
+        body["error"] = f"Database unreachable: {exc.__class__.__name__}"
+        return JSONResponse(status_code=503, content=body)
+    body["db_ping_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    
+    return body
+
+
 @api_router.post("/categories", response_model=Category)
-async def create_category(input: CategoryCreate):
-    category = Category(**input.model_dump())
+async def create_category(input: CategoryCreate, household_id: str = Depends(get_household_id)):
+    category = Category(household_id=household_id, **input.model_dump())
     doc = category.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.categories.insert_one(doc)
+    analytics_for(household_id).put_category(doc)
+    await record_changes(household_id, [journal_category(doc)])
+    await invalidate_recurrence_runs(household_id, category.recurrence)
     return category
 
 
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories():
-    categories = await db.categories.find({}, {"_id": 0}).sort("order", 1).to_list(100)
-    
-    for cat in categories:
-        if isinstance(cat['created_at'], str):
-            cat['created_at'] = datetime.fromisoformat(cat['created_at'])
+async def get_categories(household_id: str = Depends(get_household_id)):
+    async def compute():
+        categories = await db.categories.find({"household_id": household_id}, {"_id": 0}).sort("order", 1).to_list(100)
+        
+        for cat in categories:
+            if isinstance(cat['created_at'], str):
+                cat['created_at'] = datetime.fromisoformat(cat['created_at'])
+        
+        return categories
     
-    return categories
+    return await coalescer.run("categories", household_id, {}, compute)
 
 
 @api_router.put("/categories/{category_id}", response_model=Category)
-async def update_category(category_id: str, input: CategoryCreate):
+async def update_category(category_id: str, input: CategoryCreate, household_id: str = Depends(get_household_id)):
     update_doc = input.model_dump()
     
     result = await db.categories.update_one(
-        {"id": category_id},
+        {"household_id": household_id, "id": category_id},
         {"$set": update_doc}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    category = await db.categories.find_one({"id": category_id}, {"_id": 0})
+    await invalidate_recurrence_runs(household_id, input.recurrence)
+    
+    category = await db.categories.find_one({"household_id": household_id, "id": category_id}, {"_id": 0})
+    analytics_for(household_id).put_category(category)
+    await record_changes(household_id, [journal_category(category)])
     if isinstance(category['created_at'], str):
         category['created_at'] = datetime.fromisoformat(category['created_at'])
     
@@ -161,62 +1532,202 @@ async def update_category(category_id: str, input: CategoryCreate):
 
 
 @api_router.delete("/categories/{category_id}")
-async def delete_category(category_id: str):
-    result = await db.categories.delete_one({"id": category_id})
+async def delete_category(category_id: str, household_id: str = Depends(get_household_id)):
+    scope = {"household_id": household_id, "category_id": category_id}
+    result = await db.categories.delete_one({"household_id": household_id, "id": category_id})
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    await db.transactions.delete_many({"category_id": category_id})
-    await db.budgets.delete_many({"category_id": category_id})
+    await db.transactions.delete_many(scope)
+    await db.budgets.delete_many(scope)
+    analytics_for(household_id).remove_category(category_id)
+    await record_changes(household_id, [{
+        "collection": "transactions", "op": "delete_category", "category_id": category_id, "year": None
+    }])
     
     return {"message": "Category deleted successfully"}
 
 
 @api_router.post("/transactions", response_model=Transaction)
-async def create_transaction(input: TransactionCreate):
-    transaction = Transaction(**input.model_dump())
-    doc = transaction.model_dump()
+async def create_transaction(input: TransactionCreate, household_id: str = Depends(get_household_id)):
+    transaction = Transaction(household_id=household_id, **input.model_dump())
+    doc = amounts_to_cents(transaction.model_dump(), TRANSACTION_AMOUNTS)
     doc['created_at'] = doc['created_at'].isoformat()
     doc['updated_at'] = doc['updated_at'].isoformat()
     
     await db.transactions.insert_one(doc)
-    return transaction
+    doc.pop('_id', None)
+    analytics_for(household_id).put_transaction(doc)
+    await record_changes(household_id, [journal_put("transactions", doc)])
+    return Transaction(**amounts_from_cents(doc, TRANSACTION_AMOUNTS))
 
 
 @api_router.get("/transactions", response_model=List[Transaction])
-async def get_transactions(year: Optional[int] = None, category_id: Optional[str] = None):
+async def get_transactions(
+    year: Optional[int] = None,
+    month: Optional[int] = Query(default=None, ge=1, le=12),
+    category_id: Optional[str] = None,
+    household_id: str = Depends(get_household_id),
+):
+    async def compute():
+        query = {"household_id": household_id}
+        if year:
+            query["year"] = year
+            await ensure_recurring_materialized(household_id, year, [month] if month else list(range(1, 13)))
+        if month:
+            query["month"] = month
+        if category_id:
+            query["category_id"] = category_id
+        
+        transactions = await db.transactions.find(query, {"_id": 0}).to_list(1000)
+        
+        for trans in transactions:
+            amounts_from_cents(trans, TRANSACTION_AMOUNTS)
+            if isinstance(trans['created_at'], str):
+                trans['created_at'] = datetime.fromisoformat(trans['created_at'])
+            if isinstance(trans['updated_at'], str):
+                trans['updated_at'] = datetime.fromisoformat(trans['updated_at'])
+        
+        return transactions
+    
+    params = {"year": year or None, "month": month or None, "category_id": category_id or None}
+    return await coalescer.run("transactions", household_id, params, compute)
+
+
+def range_filter(minimum, maximum) -> Optional[dict]:
+    bounds = {}
+    if minimum is not None:
+        bounds["$gte"] = minimum
+    if maximum is not None:
+        bounds["$lte"] = maximum
+    return bounds or None
+
+
+def optional_cents(value: Optional[float]) -> Optional[int]:
+    return None if value is None else to_cents(value)
+
+
+def parse_year_month(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    if value is None:
+        return None
+    year, month = value.split("-")
+    return int(year), int(month)
+
+
+def period_filter(start: Optional[Tuple[int, int]], end: Optional[Tuple[int, int]]) -> dict:
+    """Período contínuo de (ano, mês), que pode atravessar a virada do ano.
+
+    O intervalo de anos vai junto das condições por mês para que o índice (household_id, year, month) seja usado.
+    """
     query = {}
-    if year:
-        query["year"] = year
+    conditions = []
+    if start is not None:
+        query["year"] = {"$gte": start[0]}
+        conditions.append({"$or": [{"year": {"$gt": start[0]}}, {"year": start[0], "month": {"$gte": start[1]}}]})
+    if end is not None:
+        query.setdefault("year", {})["$lte"] = end[0]
+        conditions.append({"$or": [{"year": {"$lt": end[0]}}, {"year": end[0], "month": {"$lte": end[1]}}]})
+    if conditions:
+        query["$and"] = conditions
+    return query
+
+
+@api_router.get("/transactions/search", response_model=TransactionSearchResult)
+async def search_transactions(
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    start_month: Optional[int] = Query(default=None, ge=1, le=12),
+    end_month: Optional[int] = Query(default=None, ge=1, le=12),
+    period_from: Optional[str] = Query(default=None, alias="from", pattern=YEAR_MONTH_PATTERN),
+    period_to: Optional[str] = Query(default=None, alias="to", pattern=YEAR_MONTH_PATTERN),
+    category_id: Optional[str] = None,
+    min_planned: Optional[float] = Query(default=None, allow_inf_nan=False, ge=-MAX_AMOUNT, le=MAX_AMOUNT),
+    max_planned: Optional[float] = Query(default=None, allow_inf_nan=False, ge=-MAX_AMOUNT, le=MAX_AMOUNT),
+    min_actual: Optional[float] = Query(default=None, allow_inf_nan=False, ge=-MAX_AMOUNT, le=MAX_AMOUNT),
+    max_actual: Optional[float] = Query(default=None, allow_inf_nan=False, ge=-MAX_AMOUNT, le=MAX_AMOUNT),
+    q: Optional[str] = None,
+    page: int = Query(default=1, ge=1),
+    page_size: int = Query(default=50, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    household_id: str = Depends(get_household_id),
+):
+    """Busca paginada de transações.
+
+    O intervalo de meses vale dentro de cada ano do intervalo de anos (ex.: 3º trimestre de 2025 e 2026);
+    para um período contínuo use `from`/`to` no formato AAAA-MM (ex.: from=2024-11&to=2025-02).
+    `q` faz busca textual nas observações usando o índice de texto.
+    """
+    period = (parse_year_month(period_from), parse_year_month(period_to))
+    if any(period) and any(value is not None for value in (start_year, end_year, start_month, end_month)):
+        raise HTTPException(status_code=400, detail="from/to cannot be combined with start_year/end_year/start_month/end_month")
+    if all(period) and period[0] > period[1]:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    if start_year is not None and end_year is not None and start_year > end_year:
+        raise HTTPException(status_code=400, detail="start_year must not be after end_year")
+    if start_month is not None and end_month is not None and start_month > end_month:
+        raise HTTPException(status_code=400, detail="start_month must not be after end_month")
+    
+    query = {"household_id": household_id, **period_filter(*period)}
+    for field, minimum, maximum in (
+        ("year", start_year, end_year),
+        ("month", start_month, end_month),
+        ("planned_cents", optional_cents(min_planned), optional_cents(max_planned)),
+        ("actual_cents", optional_cents(min_actual), optional_cents(max_actual)),
+    ):
+        bounds = range_filter(minimum, maximum)
+        if bounds:
+            query[field] = bounds
     if category_id:
         query["category_id"] = category_id
+    if q and q.strip():
+        query["$text"] = {"$search": q.strip()}
     
-    transactions = await db.transactions.find(query, {"_id": 0}).to_list(1000)
+    total, transactions = await asyncio.gather(
+        db.transactions.count_documents(query),
+        db.transactions.find(query, {"_id": 0})
+        .sort([("year", ASCENDING), ("month", ASCENDING), ("id", ASCENDING)])
+        .skip((page - 1) * page_size)
+        .limit(page_size)
+        .to_list(page_size)
+    )
     
     for trans in transactions:
+        amounts_from_cents(trans, TRANSACTION_AMOUNTS)
         if isinstance(trans['created_at'], str):
             trans['created_at'] = datetime.fromisoformat(trans['created_at'])
         if isinstance(trans['updated_at'], str):
             trans['updated_at'] = datetime.fromisoformat(trans['updated_at'])
     
-    return transactions
+    return {
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "pages": (total + page_size - 1) // page_size,
+        "items": transactions
+    }
 
 
 @api_router.put("/transactions/{transaction_id}", response_model=Transaction)
-async def update_transaction(transaction_id: str, input: TransactionUpdate):
-    update_doc = input.model_dump(exclude_none=True)
+async def update_transaction(
+    transaction_id: str,
+    input: TransactionUpdate,
+    household_id: str = Depends(get_household_id),
+):
+    update_doc = amounts_to_cents(input.model_dump(exclude_none=True), TRANSACTION_AMOUNTS)
     update_doc['updated_at'] = datetime.now(timezone.utc).isoformat()
     
     result = await db.transactions.update_one(
-        {"id": transaction_id},
+        {"household_id": household_id, "id": transaction_id},
         {"$set": update_doc}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
-    transaction = await db.transactions.find_one({"id": transaction_id}, {"_id": 0})
+    transaction = await db.transactions.find_one({"household_id": household_id, "id": transaction_id}, {"_id": 0})
+    analytics_for(household_id).put_transaction(transaction)
+    await record_changes(household_id, [journal_put("transactions", transaction)])
+    amounts_from_cents(transaction, TRANSACTION_AMOUNTS)
     if isinstance(transaction['created_at'], str):
         transaction['created_at'] = datetime.fromisoformat(transaction['created_at'])
     if isinstance(transaction['updated_at'], str):
@@ -226,18 +1737,23 @@ async def update_transaction(transaction_id: str, input: TransactionUpdate):
 
 
 @api_router.delete("/transactions/{transaction_id}")
-async def delete_transaction(transaction_id: str):
-    result = await db.transactions.delete_one({"id": transaction_id})
+async def delete_transaction(transaction_id: str, household_id: str = Depends(get_household_id)):
+    deleted = await db.transactions.find_one_and_delete(
+        {"household_id": household_id, "id": transaction_id},
+        {"_id": 0, "id": 1, "year": 1}
+    )
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
+    analytics_for(household_id).remove_transaction(transaction_id)
+    await record_changes(household_id, [journal_delete("transactions", deleted)])
     return {"message": "Transaction deleted successfully"}
 
 
 @api_router.post("/budgets", response_model=Budget)
-async def create_budget(input: BudgetCreate):
-    budget = Budget(**input.model_dump())
+async def create_budget(input: BudgetCreate, household_id: str = Depends(get_household_id)):
+    budget = Budget(household_id=household_id, **input.model_dump())
     doc = budget.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     
@@ -246,8 +1762,8 @@ async def create_budget(input: BudgetCreate):
 
 
 @api_router.get("/budgets", response_model=List[Budget])
-async def get_budgets(year: Optional[int] = None):
-    query = {}
+async def get_budgets(year: Optional[int] = None, household_id: str = Depends(get_household_id)):
+    query = {"household_id": household_id}
     if year:
         query["year"] = year
     
@@ -261,57 +1777,66 @@ async def get_budgets(year: Optional[int] = None):
 
 
 @api_router.get("/summary/{year}")
-async def get_year_summary(year: int):
-    transactions = await db.transactions.find({"year": year}, {"_id": 0}).to_list(1000)
-    incomes = await db.incomes.find({"year": year}, {"_id": 0}).to_list(100)
-    
-    total_planned = sum(t['planned_value'] for t in transactions)
-    total_actual = sum(t['actual_value'] for t in transactions)
-    
-    # Calcular receitas totais
-    total_income = sum((i['aposentadoria'] + i['salario'] + i['recursos_externos']) for i in incomes)
-    
-    monthly_summary = {}
-    for month in range(1, 13):
-        month_trans = [t for t in transactions if t['month'] == month]
-        month_income = [i for i in incomes if i['month'] == month]
+async def get_year_summary(
+    year: int,
+    as_of: Optional[datetime] = None,
+    household_id: str = Depends(get_household_id),
+):
+    async def compute():
+        if as_of is not None:
+            return await year_summary_as_of(household_id, year, as_of)
         
-        despesas = sum(t['actual_value'] for t in month_trans)
-        receitas = sum((i['aposentadoria'] + i['salario'] + i['recursos_externos']) for i in month_income)
+        await ensure_recurring_materialized(household_id, year, list(range(1, 13)))
         
-        monthly_summary[month] = {
-            "planned": sum(t['planned_value'] for t in month_trans),
-            "actual": despesas,
-            "income": receitas,
-            "balance": receitas - despesas
-        }
+        store = await load_analytics(household_id)
+        return store.year_summary(year)
     
-    category_summary = {}
-    categories = await db.categories.find({}, {"_id": 0}).to_list(100)
+    params = {"year": year, "as_of": as_of.isoformat() if as_of is not None else None}
+    return await coalescer.run("summary", household_id, params, compute)
+
+
+@api_router.get("/analytics/categories/{year}")
+async def get_category_breakdown(year: int, household_id: str = Depends(get_household_id)):
+    await ensure_recurring_materialized(household_id, year, list(range(1, 13)))
+    store = await load_analytics(household_id)
     
-    for cat in categories:
-        cat_trans = [t for t in transactions if t['category_id'] == cat['id']]
-        category_summary[cat['id']] = {
-            "name": cat['name'],
-            "planned": sum(t['planned_value'] for t in cat_trans),
-            "actual": sum(t['actual_value'] for t in cat_trans),
-            "color": cat['color']
-        }
+    return {"year": year, "categories": store.category_breakdown(year)}
+
+
+@api_router.get("/analytics/trends")
+async def get_trends(start_year: int, end_year: int, household_id: str = Depends(get_household_id)):
+    if end_year < start_year:
+        raise HTTPException(status_code=400, detail="end_year must not precede start_year")
+    if end_year - start_year + 1 > MAX_TREND_YEARS:
+        raise HTTPException(status_code=400, detail=f"Trends are limited to {MAX_TREND_YEARS} years per request")
+    store = await load_analytics(household_id)
+    
+    return {"start_year": start_year, "end_year": end_year, "months": store.trends(start_year, end_year)}
+
+
+@api_router.post("/analytics/verify")
+async def verify_analytics(household_id: str = Depends(get_household_id)):
+    """Confere a cópia em memória com o Mongo, recarregando-a em caso de divergência"""
+    store = await load_analytics(household_id)
+    return await store.verify()
+
+
+@api_router.post("/analytics/reload")
+async def reload_analytics(household_id: str = Depends(get_household_id)):
+    store = await load_analytics(household_id)
+    await store.load()
     
     return {
-        "year": year,
-        "total_planned": total_planned,
-        "total_actual": total_actual,
-        "total_income": total_income,
-        "balance": total_income - total_actual,
-        "monthly_summary": monthly_summary,
-        "category_summary": category_summary
+        "message": "Analytics store reloaded",
+        "transactions": store.transactions.size,
+        "incomes": store.incomes.size,
+        "loaded_at": store.loaded_at.isoformat()
     }
 
 
 @api_router.post("/init-default-categories")
-async def init_default_categories():
-    existing = await db.categories.count_documents({})
+async def init_default_categories(household_id: str = Depends(get_household_id)):
+    existing = await db.categories.count_documents({"household_id": household_id}, limit=1)
     if existing > 0:
         return {"message": "Categories already exist"}
     
@@ -334,35 +1859,62 @@ async def init_default_categories():
         {"name": "Água (Dia 30)", "due_day": 30, "color": "#219EBC", "order": 16}
     ]
     
+    store = analytics_for(household_id)
+    entries = []
     for cat_data in default_categories:
-        category = Category(**cat_data)
+        category = Category(household_id=household_id, **cat_data)
         doc = category.model_dump()
         doc['created_at'] = doc['created_at'].isoformat()
         await db.categories.insert_one(doc)
+        store.put_category(doc)
+        entries.append(journal_category(doc))
+    await record_changes(household_id, entries)
     
     return {"message": f"Initialized {len(default_categories)} default categories"}
 
 
+@api_router.post("/recurring/generate")
+async def generate_recurring(input: RecurrenceGenerate, household_id: str = Depends(get_household_id)):
+    if month_index(input.end_year, input.end_month) < month_index(input.start_year, input.start_month):
+        raise HTTPException(status_code=400, detail="End month must not precede start month")
+    
+    months = month_range(input.start_year, input.start_month, input.end_year, input.end_month)
+    if len(months) > MAX_RECURRENCE_MONTHS:
+        raise HTTPException(status_code=400, detail=f"Range exceeds {MAX_RECURRENCE_MONTHS} months")
+    
+    created = await generate_recurring_transactions(household_id, months)
+    
+    return {
+        "message": "Recorrências geradas com sucesso",
+        "months": len(months),
+        "created_count": created
+    }
+
+
 @api_router.post("/incomes", response_model=Income)
-async def create_income(input: IncomeCreate):
-    income = Income(**input.model_dump())
-    doc = income.model_dump()
+async def create_income(input: IncomeCreate, household_id: str = Depends(get_household_id)):
+    income = Income(household_id=household_id, **input.model_dump())
+    doc = amounts_to_cents(income.model_dump(), INCOME_AMOUNTS)
     doc['created_at'] = doc['created_at'].isoformat()
     doc['updated_at'] = doc['updated_at'].isoformat()
     
     await db.incomes.insert_one(doc)
-    return income
+    doc.pop('_id', None)
+    analytics_for(household_id).put_income(doc)
+    await record_changes(household_id, [journal_put("incomes", doc)])
+    return Income(**amounts_from_cents(doc, INCOME_AMOUNTS))
 
 
 @api_router.get("/incomes", response_model=List[Income])
-async def get_incomes(year: Optional[int] = None):
-    query = {}
+async def get_incomes(year: Optional[int] = None, household_id: str = Depends(get_household_id)):
+    query = {"household_id": household_id}
     if year:
         query["year"] = year
     
     incomes = await db.incomes.find(query, {"_id": 0}).to_list(1000)
     
     for income in incomes:
+        amounts_from_cents(income, INCOME_AMOUNTS)
         if isinstance(income['created_at'], str):
             income['created_at'] = datetime.fromisoformat(income['created_at'])
         if isinstance(income['updated_at'], str):
@@ -372,19 +1924,22 @@ async def get_incomes(year: Optional[int] = None):
 
 
 @api_router.put("/incomes/{income_id}", response_model=Income)
-async def update_income(income_id: str, input: IncomeUpdate):
-    update_doc = input.model_dump(exclude_none=True)
+async def update_income(income_id: str, input: IncomeUpdate, household_id: str = Depends(get_household_id)):
+    update_doc = amounts_to_cents(input.model_dump(exclude_none=True), INCOME_AMOUNTS)
     update_doc['updated_at'] = datetime.now(timezone.utc).isoformat()
     
     result = await db.incomes.update_one(
-        {"id": income_id},
+        {"household_id": household_id, "id": income_id},
         {"$set": update_doc}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Income not found")
     
-    income = await db.incomes.find_one({"id": income_id}, {"_id": 0})
+    income = await db.incomes.find_one({"household_id": household_id, "id": income_id}, {"_id": 0})
+    analytics_for(household_id).put_income(income)
+    await record_changes(household_id, [journal_put("incomes", income)])
+    amounts_from_cents(income, INCOME_AMOUNTS)
     if isinstance(income['created_at'], str):
         income['created_at'] = datetime.fromisoformat(income['created_at'])
     if isinstance(income['updated_at'], str):
@@ -394,22 +1949,29 @@ async def update_income(income_id: str, input: IncomeUpdate):
 
 
 @api_router.delete("/incomes/{income_id}")
-async def delete_income(income_id: str):
-    result = await db.incomes.delete_one({"id": income_id})
+async def delete_income(income_id: str, household_id: str = Depends(get_household_id)):
+    deleted = await db.incomes.find_one_and_delete(
+        {"household_id": household_id, "id": income_id},
+        {"_id": 0, "id": 1, "year": 1}
+    )
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Income not found")
     
+    analytics_for(household_id).remove_income(income_id)
+    await record_changes(household_id, [journal_delete("incomes", deleted)])
     return {"message": "Income deleted successfully"}
 
 
 @api_router.post("/reset-actual-values")
-async def reset_actual_values():
-    """Zera todos os valores realizados mantendo os planejados"""
+async def reset_actual_values(household_id: str = Depends(get_household_id)):
+    """Zera todos os valores realizados do domicílio mantendo os planejados"""
     result = await db.transactions.update_many(
-        {},
-        {"$set": {"actual_value": 0}}
+        {"household_id": household_id},
+        {"$set": {"actual_cents": 0}}
     )
+    analytics_for(household_id).reset_actual()
+    await record_changes(household_id, [{"collection": "transactions", "op": "reset_actual", "year": None}])
     
     return {
         "message": "Valores realizados zerados com sucesso",
@@ -417,8 +1979,67 @@ async def reset_actual_values():
     }
 
 
+@api_router.post("/journal/compact")
+async def compact_journal_endpoint(keep: Optional[int] = None, household_id: str = Depends(get_household_id)):
+    """Gera snapshots de todos os anos e descarta o histórico anterior aos snapshots mantidos"""
+    result = await compact_journal(household_id, keep)
+    
+    return {"message": "Journal compactado", **result}
+
+
+@api_router.get("/backup")
+async def backup(year: Optional[int] = None, household_id: str = Depends(get_household_id)):
+    """Exporta categorias, transações, receitas e orçamentos como NDJSON comprimido"""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    filename = f"backup-{household_id}-{year or 'all'}-{stamp}.ndjson.gz"
+    
+    return StreamingResponse(
+        stream_backup(household_id, year),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@api_router.post("/restore")
+async def restore(request: Request, year: Optional[int] = None, household_id: str = Depends(get_household_id)):
+    """Restaura um backup gerado por /backup; documentos existentes com o mesmo id são substituídos"""
+    restored = await restore_backup(household_id, request.stream(), year)
+    
+    return {"message": "Backup restaurado com sucesso", "restored": restored}
+
+
+@api_router.get("/stats/coalescing")
+async def coalescing_stats():
+    """Quantas leituras foram executadas e quantas aguardaram uma computação idêntica em andamento"""
+    return {"max_concurrency": coalescer.max_concurrency, "endpoints": coalescer.snapshot()}
+
+
+@api_router.post("/migrate-amounts")
+async def migrate_amounts():
+    """Converte documentos legados (valores em float) para centavos inteiros"""
+    migrated = await migrate_amounts_to_cents()
+    
+    return {
+        "message": "Valores convertidos para centavos",
+        "migrated": migrated
+    }
+
+
 app.include_router(api_router)
 
+
+@app.middleware("http")
+async def invalidate_coalesced_reads(request: Request, call_next):
+    if request.method in ("GET", "HEAD", "OPTIONS"):
+        return await call_next(request)
+    
+    household_id = (request.headers.get("x-household-id") or "").strip() or DEFAULT_HOUSEHOLD_ID
+    coalescer.invalidate(household_id)
+    response = await call_next(request)
+    coalescer.invalidate(household_id)
+    return response
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -433,6 +2054,64 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+ANALYTICS_VERIFY_INTERVAL = float(os.environ.get('ANALYTICS_VERIFY_INTERVAL', '300'))
+_background_tasks: List[asyncio.Task] = []
+
+
+async def verify_analytics_periodically():
+    while True:
+        await asyncio.sleep(ANALYTICS_VERIFY_INTERVAL)
+        for store in list(_analytics_stores.values()):
+            try:
+                report = await store.verify()
+                if not report['consistent']:
+                    logger.warning(
+                        f"Analytics store of household {store.household_id} diverged from Mongo and was reloaded: {report}"
+                    )
+            except Exception:
+                logger.exception(f"Analytics consistency check failed for household {store.household_id}")
+
+
+async def run_migration(name: str, migration):
+    """Executa a migração uma única vez por banco, registrando a conclusão na coleção migrations.
+
+    As migrações são idempotentes: instâncias que sobem juntas podem repetir o trabalho, sem efeito.
+    """
+    if await db.migrations.find_one({"_id": name}) is not None:
+        return None
+    
+    result = await migration()
+    await db.migrations.update_one(
+        {"_id": name},
+        {"$set": {"completed_at": datetime.now(timezone.utc), "result": result}},
+        upsert=True
+    )
+    logger.info(f"Migration {name} completed: {result}")
+    return result
+
+
+async def startup_db():
+    """Migrações, índices e caches executados no lifespan antes de a instância ficar pronta.
+
+    As varreduras completas do banco rodam só na primeira inicialização; a conversão de valores
+    continua disponível sob demanda em /migrate-amounts.
+    """
+    await run_migration("households_v1", migrate_households)
+    await run_migration("journal_counters_v1", migrate_journal_counters)
+    await ensure_indexes()
+    await run_migration("amounts_cents_v1", migrate_amounts_to_cents)
+    await run_migration("snapshots_bootstrap_v1", bootstrap_snapshots)
+    
+    store = await load_analytics(DEFAULT_HOUSEHOLD_ID)
+    logger.info(
+        f"Analytics store loaded: {store.transactions.size} transactions, {store.incomes.size} incomes"
+    )
+    _background_tasks.append(asyncio.create_task(verify_analytics_periodically()))
+
+
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    for task in _background_tasks:
+        task.cancel()
+    _background_tasks.clear()
+    if client is not None:
+        client.close()
\ No newline at end of file
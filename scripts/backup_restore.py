@@ -0,0 +1,93 @@
+import os
+import sys
+import argparse
+import requests
+
+BACKEND_URL = os.environ.get("BACKEND_URL", "https://fiscal-control-3.preview.emergentagent.com/api")
+CHUNK_SIZE = 64 * 1024
+
+
+def household_headers(household_id):
+    return {'X-Household-Id': household_id} if household_id else {}
+
+
+def year_params(year):
+    return {'year': year} if year else {}
+
+
+def backup(output, backend_url, household_id=None, year=None):
+    print(f"Gerando backup de {backend_url}...")
+    with requests.get(
+        f"{backend_url}/backup",
+        headers=household_headers(household_id),
+        params=year_params(year),
+        stream=True
+    ) as response:
+        response.raise_for_status()
+        written = 0
+        with open(output, 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                written += len(chunk)
+    print(f"✓ Backup salvo em {output} ({written / 1024:,.1f} KB)")
+
+
+def restore(source, backend_url, household_id=None, year=None):
+    print(f"Restaurando {source} em {backend_url}...")
+    with open(source, 'rb') as f:
+        response = requests.post(
+            f"{backend_url}/restore",
+            data=f,
+            headers={'Content-Type': 'application/gzip', **household_headers(household_id)},
+            params=year_params(year)
+        )
+    report(response)
+
+
+def clone(source_url, target_url, household_id=None, target_household_id=None, year=None):
+    """Copia os dados de um ambiente para outro sem arquivo intermediário"""
+    print(f"Clonando {source_url} -> {target_url}...")
+    with requests.get(
+        f"{source_url}/backup",
+        headers=household_headers(household_id),
+        params=year_params(year),
+        stream=True
+    ) as source:
+        source.raise_for_status()
+        response = requests.post(
+            f"{target_url}/restore",
+            data=source.iter_content(CHUNK_SIZE),
+            headers={'Content-Type': 'application/gzip', **household_headers(target_household_id or household_id)},
+            params=year_params(year)
+        )
+    report(response)
+
+
+def report(response):
+    if response.status_code != 200:
+        print(f"✗ Erro: {response.text}")
+        sys.exit(1)
+    for collection, count in response.json()['restored'].items():
+        print(f"✓ {collection}: {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backup e restauração dos dados do controle financeiro")
+    parser.add_argument('--backend-url', default=BACKEND_URL)
+    parser.add_argument('--household', help="Domicílio (X-Household-Id)")
+    parser.add_argument('--year', type=int, help="Restringe transações, receitas e orçamentos a um ano")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('backup').add_argument('output')
+    commands.add_parser('restore').add_argument('source')
+    clone_parser = commands.add_parser('clone')
+    clone_parser.add_argument('target_url')
+    clone_parser.add_argument('--target-household')
+
+    args = parser.parse_args()
+    if args.command == 'backup':
+        backup(args.output, args.backend_url, args.household, args.year)
+    elif args.command == 'restore':
+        restore(args.source, args.backend_url, args.household, args.year)
+    else:
+        clone(args.backend_url, args.target_url, args.household, args.target_household, args.year)
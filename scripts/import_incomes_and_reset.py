@@ -28,9 +28,9 @@ def import_incomes():
         payload = {
             'month': mes_num,
             'year': 2026,
-            'aposentadoria': round(float(aposentadoria), 2),
-            'salario': round(float(salario), 2),
-            'recursos_externos': round(float(recursos_externos), 2),
+            'aposentadoria': float(aposentadoria),
+            'salario': float(salario),
+            'recursos_externos': float(recursos_externos),
             'notes': 'Importado da planilha Excel'
         }
         
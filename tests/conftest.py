@@ -0,0 +1,275 @@
+import os
+import sys
+import asyncio
+import copy
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'finance_test')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import server  # noqa: E402
+
+
+def _get(doc, field):
+    return doc.get(field)
+
+
+def _matches_value(value, condition):
+    if isinstance(condition, dict) and any(key.startswith('$') for key in condition):
+        for op, operand in condition.items():
+            if op == '$in' and value not in operand:
+                return False
+            if op == '$ne' and value == operand:
+                return False
+            if op == '$exists' and (value is not None) != operand:
+                return False
+            if op in ('$gt', '$gte', '$lt', '$lte'):
+                if value is None:
+                    return False
+                if op == '$gt' and not value > operand:
+                    return False
+                if op == '$gte' and not value >= operand:
+                    return False
+                if op == '$lt' and not value < operand:
+                    return False
+                if op == '$lte' and not value <= operand:
+                    return False
+        return True
+    return value == condition
+
+
+def matches(doc, query):
+    for field, condition in (query or {}).items():
+        if field == '$or':
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif field == '$and':
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif not _matches_value(_get(doc, field), condition):
+            return False
+    return True
+
+
+def _evaluate(doc, expression):
+    if isinstance(expression, str) and expression.startswith('$'):
+        return doc.get(expression[1:])
+    if isinstance(expression, dict) and '$add' in expression:
+        return sum(_evaluate(doc, term) or 0 for term in expression['$add'])
+    if isinstance(expression, dict):
+        return {field: _evaluate(doc, value) for field, value in expression.items()}
+    return expression
+
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        key = _evaluate(doc, spec['_id'])
+        group = groups.setdefault(repr(key), {'_id': key, **{field: 0 for field in spec if field != '_id'}})
+        for field, accumulator in spec.items():
+            if field != '_id':
+                group[field] += _evaluate(doc, accumulator['$sum']) or 0
+    return list(groups.values())
+
+
+def project(doc, projection):
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    included = [field for field, flag in projection.items() if flag and field != '_id']
+    if included:
+        doc = {field: doc[field] for field in included + ['_id'] if field in doc}
+    if projection.get('_id', 1) == 0:
+        doc.pop('_id', None)
+    return doc
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self._docs.sort(key=lambda doc: (doc.get(field) is not None, doc.get(field)), reverse=order < 0)
+        return self
+
+    def skip(self, n):
+        self._docs = self._docs[n:]
+        return self
+
+    def limit(self, n):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(0)
+        return self._docs if length is None else self._docs[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._docs:
+            await asyncio.sleep(0)
+            yield doc
+
+
+class FakeCollection:
+    """Subconjunto assíncrono da API do Motor usado pelo servidor, em memória"""
+
+    def __init__(self, name):
+        self.name = name
+        self.docs = []
+        self._next_id = 0
+
+    def _insert(self, doc):
+        self._next_id += 1
+        doc.setdefault('_id', f"{self.name}-{self._next_id}")
+        self.docs.append(copy.deepcopy(doc))
+        return doc['_id']
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([project(doc, projection) for doc in self.docs if matches(doc, query)])
+
+    async def find_one(self, query=None, projection=None):
+        await asyncio.sleep(0)
+        for doc in self.docs:
+            if matches(doc, query):
+                return project(doc, projection)
+        return None
+
+    async def count_documents(self, query, limit=None):
+        await asyncio.sleep(0)
+        count = sum(1 for doc in self.docs if matches(doc, query))
+        return min(count, limit) if limit else count
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(0)
+        return SimpleNamespace(inserted_id=self._insert(doc))
+
+    async def insert_many(self, docs):
+        await asyncio.sleep(0)
+        return SimpleNamespace(inserted_ids=[self._insert(doc) for doc in docs])
+
+    async def delete_many(self, query):
+        await asyncio.sleep(0)
+        kept = [doc for doc in self.docs if not matches(doc, query)]
+        deleted = len(self.docs) - len(kept)
+        self.docs = kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    def aggregate(self, pipeline):
+        docs = copy.deepcopy(self.docs)
+        for stage in pipeline:
+            if '$match' in stage:
+                docs = [doc for doc in docs if matches(doc, stage['$match'])]
+            elif '$group' in stage:
+                docs = _group(docs, stage['$group'])
+        return FakeCursor(docs)
+
+    async def delete_one(self, query):
+        await asyncio.sleep(0)
+        for index, doc in enumerate(self.docs):
+            if matches(doc, query):
+                del self.docs[index]
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    async def distinct(self, field, query=None):
+        await asyncio.sleep(0)
+        values = []
+        for doc in self.docs:
+            if matches(doc, query) and field in doc and doc[field] not in values:
+                values.append(doc[field])
+        return values
+
+    def _apply_update(self, doc, update, inserting):
+        for op, fields in update.items():
+            for field, value in fields.items():
+                if op == '$set' or (op == '$setOnInsert' and inserting):
+                    doc[field] = copy.deepcopy(value)
+                elif op == '$inc':
+                    doc[field] = doc.get(field, 0) + value
+                elif op == '$max':
+                    doc[field] = max(doc.get(field, value), value)
+                elif op == '$unset':
+                    doc.pop(field, None)
+
+    def _upsert(self, query, update):
+        for doc in self.docs:
+            if matches(doc, query):
+                self._apply_update(doc, update, inserting=False)
+                return doc, False
+        doc = {field: value for field, value in query.items() if not field.startswith('$')}
+        self._apply_update(doc, update, inserting=True)
+        self._insert(doc)
+        return self.docs[-1], True
+
+    async def update_one(self, query, update, upsert=False):
+        await asyncio.sleep(0)
+        for doc in self.docs:
+            if matches(doc, query):
+                self._apply_update(doc, update, inserting=False)
+                return SimpleNamespace(matched_count=1, modified_count=1)
+        if upsert:
+            self._upsert(query, update)
+        return SimpleNamespace(matched_count=0, modified_count=0)
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        await asyncio.sleep(0)
+        doc, _ = self._upsert(query, update)
+        return copy.deepcopy(doc)
+
+    async def bulk_write(self, operations, ordered=True):
+        await asyncio.sleep(0)
+        upserted = {}
+        for index, op in enumerate(operations):
+            if type(op).__name__ == 'ReplaceOne':
+                self.docs = [doc for doc in self.docs if not matches(doc, op._filter)]
+                self._insert(copy.deepcopy(op._doc))
+                upserted[index] = self.docs[-1]['_id']
+            elif op._upsert:
+                doc, inserted = self._upsert(op._filter, op._doc)
+                if inserted:
+                    upserted[index] = doc['_id']
+            else:
+                for doc in self.docs:
+                    if matches(doc, op._filter):
+                        self._apply_update(doc, op._doc, inserting=False)
+                        break
+        return SimpleNamespace(upserted_ids=upserted, upserted_count=len(upserted))
+
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(server, 'db', database)
+    monkeypatch.setattr(server, '_materialized_months', set())
+    monkeypatch.setattr(server, '_generation_locks', {})
+    monkeypatch.setattr(server, '_analytics_stores', server.OrderedDict())
+    monkeypatch.setattr(server, '_journal_since_snapshot', {})
+    return database
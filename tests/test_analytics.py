@@ -0,0 +1,247 @@
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+def make_table():
+    return server.ColumnTable({"value": np.int64}, capacity=2)
+
+
+def test_column_table_upsert_grows_and_updates_in_place():
+    table = make_table()
+    for n in range(5):
+        table.upsert(f"t{n}", {"value": n})
+    table.upsert("t2", {"value": 20})
+
+    assert table.size == 5
+    assert table.capacity >= 5
+    assert table.column("value").tolist() == [0, 1, 20, 3, 4]
+
+
+def test_column_table_remove_swaps_last_row_into_hole():
+    table = make_table()
+    for n in range(4):
+        table.upsert(f"t{n}", {"value": n})
+
+    table.remove("t1")
+    table.remove("missing")
+
+    assert table.size == 3
+    assert table.ids == ["t0", "t3", "t2"]
+    assert table.rows == {"t0": 0, "t3": 1, "t2": 2}
+    assert table.column("value").tolist() == [0, 3, 2]
+
+
+def test_column_table_remove_where():
+    table = make_table()
+    for n in range(6):
+        table.upsert(f"t{n}", {"value": n})
+
+    table.remove_where(table.column("value") % 2 == 0)
+
+    assert sorted(table.ids) == ["t1", "t3", "t5"]
+    assert sorted(table.column("value").tolist()) == [1, 3, 5]
+
+
+def seed(fake_db, household_id="h1"):
+    fake_db.categories.docs.extend([
+        {"household_id": household_id, "id": "luz", "name": "Luz", "color": "#fff", "order": 1},
+        {"household_id": household_id, "id": "agua", "name": "Água", "color": "#00f", "order": 0},
+    ])
+    fake_db.transactions.docs.extend([
+        {"household_id": household_id, "id": "t1", "category_id": "luz", "year": 2026, "month": 1,
+         "planned_cents": 10000, "actual_cents": 9050},
+        {"household_id": household_id, "id": "t2", "category_id": "agua", "year": 2026, "month": 1,
+         "planned_cents": 5000, "actual_cents": 5000},
+        {"household_id": household_id, "id": "t3", "category_id": "luz", "year": 2025, "month": 12,
+         "planned_cents": 7000, "actual_cents": 7000},
+    ])
+    fake_db.incomes.docs.append({
+        "household_id": household_id, "id": "i1", "year": 2026, "month": 1,
+        "aposentadoria_cents": 100000, "salario_cents": 50000, "recursos_externos_cents": 1,
+    })
+
+
+def test_year_summary_from_loaded_store(fake_db):
+    seed(fake_db)
+    store = asyncio.run(server.load_analytics("h1"))
+
+    summary = store.year_summary(2026)
+
+    assert summary["total_planned"] == 150.0
+    assert summary["total_actual"] == 140.5
+    assert summary["monthly_summary"][1]["income"] == 1500.01
+    assert summary["monthly_summary"][1]["balance"] == 1359.51
+    assert list(summary["category_summary"]) == ["agua", "luz"]
+    assert summary["category_summary"]["luz"]["actual"] == 90.5
+
+
+def test_year_summary_follows_patches(fake_db):
+    seed(fake_db)
+    store = asyncio.run(server.load_analytics("h1"))
+
+    store.put_transaction({"id": "t4", "category_id": "agua", "year": 2026, "month": 2,
+                           "planned_cents": 1, "actual_cents": 2})
+    store.remove_transaction("t1")
+    store.remove_category("agua")
+
+    summary = store.year_summary(2026)
+    assert list(summary["category_summary"]) == ["luz"]
+    assert summary["total_planned"] == 0.0
+
+
+def test_concurrent_loads_share_one_reload_and_keep_writes(fake_db):
+    seed(fake_db)
+    store = server.AnalyticsStore("h1")
+
+    async def scenario():
+        first = asyncio.ensure_future(store.load())
+        second = asyncio.ensure_future(store.load())
+        while store._pending is None:
+            await asyncio.sleep(0)
+        # Escrita confirmada depois que a recarga já leu as transações do Mongo
+        store.put_transaction({"id": "t9", "category_id": "luz", "year": 2026, "month": 3,
+                               "planned_cents": 300, "actual_cents": 0})
+        await asyncio.gather(first, second)
+
+    asyncio.run(scenario())
+
+    assert store.loaded
+    assert "t9" in store.transactions.rows
+    assert store.year_summary(2026)["monthly_summary"][3]["planned"] == 3.0
+
+
+
+async def load_and_verify(household_id):
+    store = await server.load_analytics(household_id)
+    return await store.verify()
+
+
+def test_verify_is_consistent_after_load(fake_db):
+    seed(fake_db)
+
+    report = asyncio.run(load_and_verify("h1"))
+
+    assert report["consistent"]
+    assert report["differences"] == []
+
+
+def test_verify_detects_category_edits_and_value_swaps(fake_db):
+    seed(fake_db)
+    store = asyncio.run(server.load_analytics("h1"))
+    fake_db.categories.docs[0]['name'] = "Energia"
+    t1, _, t3 = fake_db.transactions.docs
+    t1['planned_cents'], t3['planned_cents'] = t3['planned_cents'], t1['planned_cents']
+
+    report = asyncio.run(store.verify())
+
+    assert not report["consistent"]
+    assert report["expected"]["transactions"] == report["store"]["transactions"]
+    assert report["differences"] == ["categories", "transactions 2025-12 luz", "transactions 2026-01 luz"]
+    assert store.categories["luz"]["name"] == "Energia"
+    assert asyncio.run(store.verify())["consistent"]
+
+
+def test_local_writes_keep_the_store_sequence_current(fake_db):
+    seed(fake_db)
+
+    async def scenario():
+        store = await server.load_analytics("h1")
+        doc = transaction_doc("t4")
+        fake_db.transactions.docs.append(doc)
+        store.put_transaction(doc)
+        await server.record_changes("h1", [server.journal_put("transactions", doc)])
+        loaded_at = store.loaded_at
+        await server.load_analytics("h1")
+        return store, loaded_at
+
+    store, loaded_at = asyncio.run(scenario())
+
+    assert store.seq == 1
+    assert store.loaded_at == loaded_at
+    assert asyncio.run(store.verify())["consistent"]
+
+
+def test_writes_from_another_instance_trigger_reload_on_read(fake_db):
+    seed(fake_db)
+
+    async def scenario():
+        store = await server.load_analytics("h1")
+        # Simula outra instância: documento e journal gravados sem passar por esta cópia
+        fake_db.transactions.docs.append(transaction_doc("t5"))
+        await server.next_sequence("h1")
+        assert "t5" not in store.transactions.rows
+        assert await server.load_analytics("h1") is store
+        return store
+
+    store = asyncio.run(scenario())
+
+    assert "t5" in store.transactions.rows
+    assert store.seq == 1
+
+
+def transaction_doc(doc_id):
+    return {"household_id": "h1", "id": doc_id, "category_id": "agua", "year": 2026, "month": 4,
+            "planned_cents": 100, "actual_cents": 0}
+
+
+def test_build_year_summary_ignores_rows_outside_the_year():
+    categories = [{"id": "luz", "name": "Luz", "color": "#fff"}]
+
+    summary = server.build_year_summary(
+        2026,
+        categories,
+        np.array([0, 1, 13], dtype=np.int64),
+        np.array([0, 0, 0], dtype=np.int64),
+        np.array([100, 200, 400], dtype=np.int64),
+        np.array([10, 20, 40], dtype=np.int64),
+        np.array([-1, 12, 14], dtype=np.int64),
+        np.array([1000, 2000, 4000], dtype=np.int64),
+    )
+
+    assert summary["total_planned"] == 2.0
+    assert summary["total_actual"] == 0.2
+    assert summary["total_income"] == 20.0
+    assert summary["category_summary"]["luz"]["planned"] == 2.0
+    assert sum(month["planned"] for month in summary["monthly_summary"].values()) == 2.0
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/transactions", {"category_id": "luz", "year": 2026, "planned_value": 1, "actual_value": 0}),
+    ("/api/incomes", {"year": 2026, "aposentadoria": 1, "salario": 0, "recursos_externos": 0}),
+])
+@pytest.mark.parametrize("month", [0, 13])
+def test_writes_reject_months_outside_the_year(fake_db, path, body, month):
+    response = TestClient(server.app).post(path, json={**body, "month": month})
+
+    assert response.status_code == 422
+
+
+def test_category_breakdown_skips_invalid_months(fake_db):
+    seed(fake_db)
+    for month, doc_id in ((0, "t7"), (13, "t8")):
+        fake_db.transactions.docs.append({**transaction_doc(doc_id), "month": month})
+    store = asyncio.run(server.load_analytics("h1"))
+
+    breakdown = store.category_breakdown(2026)
+
+    assert breakdown["agua"]["planned"] == [50.0] + [0.0] * 11
+    assert breakdown["luz"]["planned"][0] == 100.0
+
+
+@pytest.mark.parametrize("params, status", [
+    ({"start_year": 2026 - server.MAX_TREND_YEARS + 1, "end_year": 2026}, 200),
+    ({"start_year": 2026 - server.MAX_TREND_YEARS, "end_year": 2026}, 400),
+    ({"start_year": 0, "end_year": 100000000}, 400),
+    ({"start_year": 2026, "end_year": 2025}, 400),
+])
+def test_trends_span_is_bounded(fake_db, params, status):
+    response = TestClient(server.app).get("/api/analytics/trends", params=params)
+
+    assert response.status_code == status
+    if status == 200:
+        assert len(response.json()["months"]) == server.MAX_TREND_YEARS * 12
@@ -0,0 +1,104 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def seed(fake_db):
+    fake_db.categories.docs.append({"household_id": "h1", "id": "luz", "name": "Luz", "color": "#fff", "order": 0})
+    fake_db.transactions.docs.extend([
+        {"household_id": "h1", "id": "t1", "category_id": "luz", "year": 2025, "month": 12,
+         "planned_cents": 100, "actual_cents": 90, "notes": "ção"},
+        {"household_id": "h1", "id": "t2", "category_id": "luz", "year": 2026, "month": 1,
+         "planned_cents": 200, "actual_cents": 0},
+    ])
+    fake_db.incomes.docs.append({"household_id": "h1", "id": "i1", "year": 2026, "month": 1,
+                                 "aposentadoria_cents": 1, "salario_cents": 2, "recursos_externos_cents": 3})
+    fake_db.budgets.docs.append({"household_id": "h1", "id": "b1", "category_id": "luz", "year": 2026,
+                                 "monthly_target": 50.0})
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+async def replay(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def restore(payload, year=None):
+    return asyncio.run(server.restore_backup("h2", replay(payload), year))
+
+
+def strip(docs, household_id):
+    return sorted(
+        ({k: v for k, v in doc.items() if k not in ("_id", "household_id")} for doc in docs
+         if doc['household_id'] == household_id),
+        key=lambda doc: doc['id']
+    )
+
+
+def test_backup_round_trip_into_another_household(fake_db):
+    seed(fake_db)
+    chunks = asyncio.run(collect(server.stream_backup("h1")))
+
+    restored = restore(chunks)
+
+    assert restored == {"categories": 1, "transactions": 2, "incomes": 1, "budgets": 1, "skipped": 0}
+    for name in server.BACKUP_COLLECTIONS:
+        assert strip(fake_db[name].docs, "h2") == strip(fake_db[name].docs, "h1")
+    assert sorted(snap['year'] for snap in fake_db.snapshots.docs if snap['household_id'] == "h2") == [2025, 2026]
+
+
+def test_backup_of_one_year_restores_only_that_year(fake_db):
+    seed(fake_db)
+    chunks = asyncio.run(collect(server.stream_backup("h1", 2026)))
+
+    restored = restore(chunks, 2026)
+
+    assert restored["transactions"] == 1
+    assert [doc['id'] for doc in fake_db.transactions.docs if doc['household_id'] == "h2"] == ["t2"]
+
+
+@pytest.mark.parametrize("record", [
+    {"collection": "transactions", "doc": {"year": 2026, "month": 1}},
+    {"collection": "transactions", "doc": {"id": "t1", "month": 1}},
+    {"collection": "incomes", "doc": {"id": "i1", "year": "2026", "month": 1}},
+    {"collection": "incomes", "doc": {"id": "i1", "year": 2026, "month": 13}},
+    {"collection": "budgets", "doc": {"id": "b1"}},
+    {"collection": "categories", "doc": ["luz"]},
+    {"collection": "categories"},
+    {"collection": "categories", "doc": {"id": "gas", "name": "Gás"}},
+    {"collection": "categories", "doc": {"id": "gas", "name": "Gás", "color": "#000", "order": "2"}},
+    {"collection": "transactions", "doc": {"id": "t1", "year": 2026, "month": 3}},
+    {"collection": "transactions", "doc": {"id": "t1", "year": 2026, "month": 3, "category_id": "luz",
+                                           "planned_cents": 10.5, "actual_cents": 0}},
+    {"collection": "transactions", "doc": {"id": "t1", "year": 2026, "month": 3, "category_id": "luz",
+                                           "planned_cents": 10 ** 20, "actual_cents": 0}},
+    {"collection": "transactions", "doc": {"id": "t1", "year": 2026, "month": 3, "category_id": 7,
+                                           "planned_cents": 1, "actual_cents": 0}},
+    {"collection": "incomes", "doc": {"id": "i1", "year": 2026, "month": 3, "salario_cents": 1}},
+    {"collection": "budgets", "doc": {"id": "b1", "year": 2026, "category_id": "luz"}},
+    {"collection": "budgets", "doc": {"id": "b1", "year": 2026, "monthly_target": 10.0}},
+])
+def test_restore_rejects_incomplete_records_with_line_number(fake_db, record):
+    lines = [{"collection": "categories", "doc": {"id": "luz", "name": "Luz", "color": "#fff", "order": 0}}, record]
+    payload = gzip.compress("".join(json.dumps(line) + "\n" for line in lines).encode())
+
+    with pytest.raises(HTTPException) as exc:
+        restore([payload])
+
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "Invalid backup record at line 2"
+
+
+def test_restore_rejects_non_gzip_payload(fake_db):
+    with pytest.raises(HTTPException) as exc:
+        restore([b"not gzip"])
+
+    assert exc.value.status_code == 400
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import server
+
+T0 = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def transaction(doc_id, planned, month=1, category_id="luz"):
+    return {"id": doc_id, "year": 2026, "month": month, "category_id": category_id,
+            "planned_cents": planned, "actual_cents": 0}
+
+
+def stamp(fake_db, seq, ts):
+    for entry in fake_db.journal.docs:
+        if entry['seq'] == seq:
+            entry['ts'] = ts
+
+
+def test_sequences_are_contiguous_per_household(fake_db):
+    async def scenario():
+        await server.record_changes("h1", [server.journal_put("transactions", transaction("a", 1))])
+        await server.record_changes("h2", [server.journal_put("transactions", transaction("b", 1))])
+        await server.record_changes("h1", [
+            server.journal_put("transactions", transaction("c", 1)),
+            server.journal_delete("transactions", transaction("a", 1)),
+        ])
+
+    asyncio.run(scenario())
+
+    seqs = {}
+    for entry in fake_db.journal.docs:
+        seqs.setdefault(entry['household_id'], []).append(entry['seq'])
+    assert seqs == {"h1": [1, 2, 3], "h2": [1]}
+    assert asyncio.run(server.current_sequence("h1")) == 3
+
+
+def test_legacy_counter_seeds_households_with_history(fake_db):
+    fake_db.counters.docs.append({"_id": server.LEGACY_JOURNAL_COUNTER, "seq": 40})
+    fake_db.journal.docs.append({"household_id": "h1", "seq": 40, "year": 2026})
+
+    assert asyncio.run(server.migrate_journal_counters()) == 1
+    assert asyncio.run(server.next_sequence("h1")) == 41
+    assert asyncio.run(server.next_sequence("h2")) == 1
+    assert asyncio.run(server.migrate_journal_counters()) == 0
+
+
+def test_year_summary_as_of_replays_journal_over_snapshot(fake_db):
+    fake_db.categories.docs.append({"household_id": "h1", "id": "luz", "name": "Luz", "color": "#fff", "order": 0})
+    fake_db.transactions.docs.append({"household_id": "h1", **transaction("t1", 10000)})
+
+    async def scenario():
+        snapshot = await server.take_snapshot("h1", 2026, base=True)
+        fake_db.snapshots.docs[-1]['ts'] = T0
+        assert snapshot['seq'] == 0
+
+        await server.record_changes("h1", [server.journal_put("transactions", transaction("t2", 5000, month=2))])
+        await server.record_changes("h1", [server.journal_put("transactions", transaction("t1", 12000))])
+        await server.record_changes("h1", [server.journal_delete("transactions", transaction("t2", 5000))])
+        for seq in (1, 2, 3):
+            stamp(fake_db, seq, T0 + timedelta(days=seq))
+
+        return [
+            await server.year_summary_as_of("h1", 2026, T0 + timedelta(days=day, hours=1))
+            for day in range(4)
+        ]
+
+    summaries = asyncio.run(scenario())
+
+    assert [s["total_planned"] for s in summaries] == [100.0, 150.0, 170.0, 120.0]
+    assert summaries[1]["monthly_summary"][2]["planned"] == 50.0
+    assert summaries[3]["category_summary"]["luz"]["planned"] == 120.0
+
+
+def test_year_summary_as_of_ignores_other_households(fake_db):
+    fake_db.categories.docs.append({"household_id": "h1", "id": "luz", "name": "Luz", "color": "#fff", "order": 0})
+
+    async def scenario():
+        await server.record_changes("h1", [server.journal_put("transactions", transaction("t1", 100))])
+        await server.record_changes("h2", [server.journal_put("transactions", transaction("t9", 999))])
+        return await server.year_summary_as_of("h1", 2026, datetime.now(timezone.utc) + timedelta(seconds=1))
+
+    assert asyncio.run(scenario())["total_planned"] == 1.0
+
+
+def test_prune_keeps_at_least_one_snapshot(fake_db):
+    async def scenario():
+        for n in range(3):
+            await server.record_changes("h1", [server.journal_put("transactions", transaction(f"t{n}", n))])
+            await server.take_snapshot("h1", 2026)
+        return await server.prune_journal("h1", 2026, 0)
+
+    deleted_entries, deleted_snapshots = asyncio.run(scenario())
+
+    assert (deleted_entries, deleted_snapshots) == (3, 2)
+    assert [snap['seq'] for snap in fake_db.snapshots.docs] == [3]
+    assert fake_db.snapshots.docs[0]['base'] is True
+
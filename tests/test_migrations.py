@@ -0,0 +1,36 @@
+import asyncio
+
+import server
+
+
+def test_amount_migration_streams_every_legacy_document(fake_db):
+    fake_db.transactions.docs.extend(
+        {"_id": n, "household_id": "h1", "id": f"t{n}", "planned_value": n + 0.1, "actual_value": 0}
+        for n in range(5)
+    )
+    fake_db.transactions.docs.append({"_id": 9, "household_id": "h1", "id": "t9", "planned_cents": 7, "actual_cents": 0})
+    fake_db.incomes.docs.append({"_id": 1, "household_id": "h1", "id": "i1", "salario": 1000.5})
+
+    migrated = asyncio.run(server.migrate_amounts_to_cents(batch_size=2))
+
+    assert migrated == {"transactions": 5, "incomes": 1}
+    assert [doc['planned_cents'] for doc in fake_db.transactions.docs] == [10, 110, 210, 310, 410, 7]
+    assert all("planned_value" not in doc for doc in fake_db.transactions.docs)
+    assert fake_db.incomes.docs[0] == {"_id": 1, "household_id": "h1", "id": "i1", "salario_cents": 100050}
+
+
+def test_run_migration_executes_once(fake_db):
+    calls = []
+
+    async def migration():
+        calls.append(1)
+        return {"converted": len(calls)}
+
+    async def scenario():
+        first = await server.run_migration("example_v1", migration)
+        second = await server.run_migration("example_v1", migration)
+        return first, second
+
+    assert asyncio.run(scenario()) == ({"converted": 1}, None)
+    assert calls == [1]
+    assert fake_db.migrations.docs[0]["result"] == {"converted": 1}
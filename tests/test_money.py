@@ -0,0 +1,45 @@
+import math
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+import server
+
+
+@pytest.mark.parametrize("value, cents", [
+    (0.1 + 0.2, 30),
+    (19.99, 1999),
+    (0.005, 1),
+    (-0.005, -1),
+    (1234567.89, 123456789),
+])
+def test_to_cents_rounds_half_up_without_float_drift(value, cents):
+    assert server.to_cents(value) == cents
+
+
+def test_cents_round_trip():
+    assert server.from_cents(server.to_cents(2500.5)) == 2500.5
+
+
+def test_amounts_to_cents_replaces_fields():
+    doc = server.amounts_to_cents({"planned_value": 10.1, "actual_value": 0}, server.TRANSACTION_AMOUNTS)
+
+    assert doc == {"planned_cents": 1010, "actual_cents": 0}
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf, server.MAX_AMOUNT * 10])
+def test_models_reject_non_finite_and_out_of_range_amounts(value):
+    with pytest.raises(ValidationError):
+        server.TransactionCreate(category_id="c", year=2026, month=1, planned_value=value, actual_value=0)
+    with pytest.raises(ValidationError):
+        server.IncomeUpdate(salario=value)
+    with pytest.raises(ValidationError):
+        server.RecurrenceRule(amount=value, start_year=2026, start_month=1)
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-Infinity", "1e30"])
+def test_search_rejects_non_finite_value_filters(value):
+    response = TestClient(server.app).get("/api/transactions/search", params={"min_planned": value})
+
+    assert response.status_code == 422
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+def test_recurrence_amount_respects_start_and_end():
+    rule = {"amount": 100.0, "start_year": 2026, "start_month": 3, "end_year": 2026, "end_month": 5}
+
+    assert server.recurrence_amount(rule, 2026, 2) is None
+    assert server.recurrence_amount(rule, 2026, 3) == 100.0
+    assert server.recurrence_amount(rule, 2026, 5) == 100.0
+    assert server.recurrence_amount(rule, 2026, 6) is None
+
+
+def test_recurrence_amount_open_end_defaults_to_december():
+    rule = {"amount": 10.0, "start_year": 2025, "start_month": 1, "end_year": 2025, "end_month": None}
+
+    assert server.recurrence_amount(rule, 2025, 12) == 10.0
+    assert server.recurrence_amount(rule, 2026, 1) is None
+
+
+def test_recurrence_amount_applies_annual_adjustment_every_twelve_months():
+    rule = {"amount": 100.0, "start_year": 2025, "start_month": 6, "annual_adjustment": 10}
+
+    assert server.recurrence_amount(rule, 2026, 5) == 100.0
+    assert server.recurrence_amount(rule, 2026, 6) == 110.0
+    assert server.recurrence_amount(rule, 2027, 6) == 121.0
+
+
+def test_month_range_crosses_year_end():
+    assert server.month_range(2025, 11, 2026, 2) == [(2025, 11), (2025, 12), (2026, 1), (2026, 2)]
+
+
+def test_concurrent_lazy_generation_creates_each_month_once(fake_db):
+    fake_db.categories.docs.append({
+        "household_id": "h1",
+        "id": "brisanet",
+        "recurrence": {"amount": 99.9, "start_year": 2026, "start_month": 1},
+    })
+
+    async def scenario():
+        await asyncio.gather(
+            server.ensure_recurring_materialized("h1", 2026, list(range(1, 13))),
+            server.ensure_recurring_materialized("h1", 2026, list(range(1, 13))),
+            server.ensure_recurring_materialized("h1", 2026, [3]),
+            server.generate_recurring_transactions("h1", server.month_range(2026, 1, 2026, 12)),
+        )
+
+    asyncio.run(scenario())
+
+    keys = [doc['recurrence_key'] for doc in fake_db.transactions.docs]
+    assert len(keys) == 12
+    assert len(set(keys)) == 12
+    assert all(doc['planned_cents'] == 9990 for doc in fake_db.transactions.docs)
+
+
+def test_generation_keeps_existing_month_values(fake_db):
+    fake_db.categories.docs.append({
+        "household_id": "h1",
+        "id": "energia",
+        "recurrence": {"amount": 150.0, "start_year": 2026, "start_month": 1},
+    })
+    fake_db.transactions.docs.append({
+        "household_id": "h1", "id": "manual", "category_id": "energia",
+        "year": 2026, "month": 2, "planned_cents": 12345, "actual_cents": 0,
+    })
+
+    created = asyncio.run(server.generate_recurring_transactions("h1", [(2026, 1), (2026, 2)]))
+
+    assert created == 1
+    february = [doc for doc in fake_db.transactions.docs if doc['month'] == 2]
+    assert [doc['planned_cents'] for doc in february] == [12345]
+
+
+def test_generation_refuses_months_outside_the_year(fake_db):
+    fake_db.categories.docs.append({
+        "household_id": "h1",
+        "id": "energia",
+        "recurrence": {"amount": 150.0, "start_year": 2026, "start_month": 1},
+    })
+
+    for months in ([13], [0, 1]):
+        with pytest.raises(ValueError):
+            asyncio.run(server.ensure_recurring_materialized("h1", 2026, months))
+    with pytest.raises(ValueError):
+        asyncio.run(server.generate_recurring_transactions("h1", [(2026, 13)]))
+
+    assert fake_db.transactions.docs == []
+    assert fake_db.recurrence_runs.docs == []
+
+
+@pytest.mark.parametrize("month", [0, 13])
+def test_transactions_read_rejects_invalid_month_without_writing(fake_db, month):
+    fake_db.categories.docs.append({
+        "household_id": "default",
+        "id": "energia",
+        "recurrence": {"amount": 150.0, "start_year": 2026, "start_month": 1},
+    })
+
+    response = TestClient(server.app).get("/api/transactions", params={"year": 2026, "month": month})
+
+    assert response.status_code == 422
+    assert fake_db.transactions.docs == []
+    assert fake_db.recurrence_runs.docs == []
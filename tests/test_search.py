@@ -0,0 +1,52 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture
+def client(fake_db):
+    for n, (year, month) in enumerate([(2024, 10), (2024, 11), (2024, 12), (2025, 1), (2025, 2), (2025, 3), (2025, 11)]):
+        fake_db.transactions.docs.append({
+            "household_id": "default", "id": f"t{n}", "category_id": "luz", "year": year, "month": month,
+            "planned_cents": 100 * (n + 1), "actual_cents": 0,
+            "created_at": "2026-01-01T00:00:00+00:00", "updated_at": "2026-01-01T00:00:00+00:00",
+        })
+    return TestClient(server.app)
+
+
+def periods(response):
+    assert response.status_code == 200, response.text
+    return [(t["year"], t["month"]) for t in response.json()["items"]]
+
+
+def test_from_to_crosses_the_year_end(client):
+    response = client.get("/api/transactions/search", params={"from": "2024-11", "to": "2025-02"})
+
+    assert periods(response) == [(2024, 11), (2024, 12), (2025, 1), (2025, 2)]
+    assert response.json()["total"] == 4
+
+
+def test_open_ended_period(client):
+    assert periods(client.get("/api/transactions/search", params={"from": "2025-02"})) == [
+        (2025, 2), (2025, 3), (2025, 11)
+    ]
+    assert periods(client.get("/api/transactions/search", params={"to": "2024-11"})) == [(2024, 10), (2024, 11)]
+
+
+def test_per_year_month_window_is_kept(client):
+    response = client.get("/api/transactions/search", params={
+        "start_year": 2024, "end_year": 2025, "start_month": 11, "end_month": 12
+    })
+
+    assert periods(response) == [(2024, 11), (2024, 12), (2025, 11)]
+
+
+@pytest.mark.parametrize("params, status", [
+    ({"from": "2025-02", "to": "2024-11"}, 400),
+    ({"from": "2024-11", "start_year": 2024}, 400),
+    ({"from": "2024-13"}, 422),
+    ({"to": "2024-1"}, 422),
+])
+def test_invalid_periods(client, params, status):
+    assert client.get("/api/transactions/search", params=params).status_code == status
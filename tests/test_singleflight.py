@@ -0,0 +1,79 @@
+import asyncio
+
+import server
+
+
+def counting(calls, result, gate=None):
+    async def compute():
+        calls.append(result)
+        if gate is not None:
+            await gate.wait()
+        await asyncio.sleep(0)
+        return result
+    return compute
+
+
+def test_identical_concurrent_reads_share_one_computation():
+    flight = server.SingleFlight(4)
+    calls = []
+
+    async def scenario():
+        return await asyncio.gather(*(
+            flight.run("summary", "h1", {"year": 2026, "as_of": None}, counting(calls, "r"))
+            for _ in range(5)
+        ))
+
+    assert asyncio.run(scenario()) == ["r"] * 5
+    assert calls == ["r"]
+    assert flight.stats["summary"] == {"executed": 1, "coalesced": 4}
+    assert flight.snapshot()["summary"]["inflight"] == 0
+
+
+def test_different_params_or_households_are_not_coalesced():
+    flight = server.SingleFlight(4)
+    calls = []
+
+    async def scenario():
+        return await asyncio.gather(
+            flight.run("summary", "h1", {"year": 2025}, counting(calls, "h1-2025")),
+            flight.run("summary", "h1", {"year": 2026}, counting(calls, "h1-2026")),
+            flight.run("summary", "h2", {"year": 2026}, counting(calls, "h2-2026")),
+        )
+
+    assert asyncio.run(scenario()) == ["h1-2025", "h1-2026", "h2-2026"]
+    assert sorted(calls) == ["h1-2025", "h1-2026", "h2-2026"]
+
+
+def test_invalidate_starts_a_new_flight_for_later_reads():
+    flight = server.SingleFlight(4)
+    calls = []
+
+    async def scenario():
+        gate = asyncio.Event()
+        stale = asyncio.ensure_future(flight.run("categories", "h1", {}, counting(calls, "old", gate)))
+        await asyncio.sleep(0)
+        flight.invalidate("h1")
+        fresh = await flight.run("categories", "h1", {}, counting(calls, "new"))
+        gate.set()
+        return await stale, fresh
+
+    assert asyncio.run(scenario()) == ("old", "new")
+    assert calls == ["old", "new"]
+
+
+def test_concurrency_limit_is_per_household():
+    flight = server.SingleFlight(1)
+    calls = []
+
+    async def scenario():
+        gate = asyncio.Event()
+        busy = asyncio.ensure_future(flight.run("summary", "h1", {"year": 2025}, counting(calls, "h1-2025", gate)))
+        queued = asyncio.ensure_future(flight.run("summary", "h1", {"year": 2026}, counting(calls, "h1-2026")))
+        other = await asyncio.wait_for(flight.run("summary", "h2", {"year": 2025}, counting(calls, "h2-2025")), 1)
+        # h1 continua limitado a uma computação: a segunda espera a primeira terminar
+        assert "h1-2026" not in calls
+        gate.set()
+        return other, await busy, await queued
+
+    assert asyncio.run(scenario()) == ("h2-2025", "h1-2025", "h1-2026")
+    assert flight._limits == {}